@@ -33,6 +33,41 @@ const float FILTER_FACTOR = 0.6;
 HX711 hx711_cell;
 Preferences preferences;
 
+// --- Serial Output Format ---
+// 0: "Date: dd/mm/yyyy, Weight: x.xx, Seq: <seq>" (readable in the Serial Monitor)
+// 1: compact frame "$W,<seq>,<dd/mm/yyyy>,<hh:mm:ss>,<kg>*<checksum>", where the
+//    checksum is the XOR of the characters between '$' and '*' as two hex digits
+#define USE_COMPACT_FRAMES 0
+unsigned long frameSequence = 0;  // Kept in the record buffer, so it survives restarts
+
+// --- Live Weight Stream ---
+// While idle, the current weight is also sent every STREAM_INTERVAL_MS, as a
+// bare "x.xx" line (or "$S,<kg>*<checksum>" with compact frames). The PC uses
+// it to detect a stable weight; without it auto capture stays off.
+#define STREAM_READINGS 1
+#define STREAM_INTERVAL_MS 250
+unsigned long lastStreamMillis = 0;
+
+// --- Record Buffer ---
+// Every logged weighing is also stored in flash (NVS), so weighings made
+// while the PC is off can be collected later (bulk_ingest.py). Serial
+// commands, one per line:
+//   DUMP  -> "$D,BEGIN,<count>*CS", one "$R,<seq>,<dd/mm/yyyy>,<hh:mm:ss>,<kg>*CS"
+//            frame per record (oldest first), then "$D,END,<count>*CS"
+//   CLEAR -> empties the buffer and answers "$D,CLEARED*CS"
+// When the buffer is full the oldest record is overwritten.
+#define RECORD_BUFFER_SIZE 150
+struct LoggedRecord {
+    uint32_t seq;
+    char date[11];  // dd/mm/yyyy
+    char time[9];   // hh:mm:ss
+    float weightKg;
+};
+Preferences recordBuffer;
+uint16_t recordHead = 0;   // Slot of the oldest record
+uint16_t recordCount = 0;
+String commandLine = "";
+
 // --- Switch Pin Configuration ---
 const int sw1 = 12; // Calibrate / Confirm
 const int sw2 = 13; // Tare
@@ -90,6 +125,7 @@ void setup() {
 
     initRTC();
     initHX711();
+    initRecordBuffer();
 
     pinMode(sw1, INPUT_PULLUP);
     pinMode(sw2, INPUT_PULLUP);
@@ -103,6 +139,8 @@ void setup() {
 }
 
 void loop() {
+    handleSerialCommands();
+
     // Button 1: Start Calibration
     if (digitalRead(sw1) == LOW) {
         calibrateHX711(); 
@@ -143,6 +181,13 @@ void loop() {
         dtostrf(weight / 1000.0, 8, 2, buffer); 
 
         lcd.print(String(buffer) + " kg       "); 
+
+#if STREAM_READINGS
+        if (millis() - lastStreamMillis >= STREAM_INTERVAL_MS) {
+            lastStreamMillis = millis();
+            streamWeight(weight / 1000.0);
+        }
+#endif
         
         lcd.setCursor(0, 2);
         lcd.print("                    ");
@@ -330,12 +375,124 @@ void displayAndLogWeight() {
     char timestring[10];
     sprintf(timestring, "%02d:%02d:%02d", now.Hour(), now.Minute(), now.Second());
 
+    LoggedRecord record;
+    record.seq = ++frameSequence;
+    snprintf(record.date, sizeof(record.date), "%s", dateStr.c_str());
+    snprintf(record.time, sizeof(record.time), "%s", timestring);
+    record.weightKg = weight/1000;
+    storeRecord(record);
+
+#if USE_COMPACT_FRAMES
+    sendCompactFrame('W', record.seq, record.date, record.time, record.weightKg);
+#else
     Serial.print("Date: ");
     Serial.print(dateStr);
     Serial.print(", Weight: ");
     Serial.print(weight/1000, 2); 
+    Serial.print(", Seq: ");
+    Serial.print(record.seq);
     Serial.println(); 
+#endif
 
     displayLCDMessage("Weight Logged:", String(weight/1000, 2) + " kg", "Date: " + dateStr, "Time: " + String(timestring));
     delayWithCancellation(2500); 
-}
\ No newline at end of file
+}
+
+void streamWeight(float weightKg) {
+#if USE_COMPACT_FRAMES
+    char weightStr[16];
+    dtostrf(weightKg, 1, 2, weightStr);
+
+    char payload[24];
+    snprintf(payload, sizeof(payload), "S,%s", weightStr);
+    sendFrame(payload);
+#else
+    Serial.println(weightKg, 2);
+#endif
+}
+
+// type 'W': logged weighing, 'R': buffered record sent by DUMP
+void sendCompactFrame(char type, unsigned long seq, const char* dateStr, const char* timeStr, float weightKg) {
+    char weightStr[16];
+    dtostrf(weightKg, 1, 2, weightStr);
+
+    char payload[64];
+    snprintf(payload, sizeof(payload), "%c,%lu,%s,%s,%s", type, seq, dateStr, timeStr, weightStr);
+    sendFrame(payload);
+}
+
+void sendFrame(const char* payload) {
+    byte checksum = 0;
+    for (const char* p = payload; *p; p++) checksum ^= *p;
+
+    char frame[72];
+    snprintf(frame, sizeof(frame), "$%s*%02X", payload, checksum);
+    Serial.println(frame);
+}
+
+// --- Record Buffer Functions ---
+void initRecordBuffer() {
+    recordBuffer.begin("records", false);
+    recordHead = recordBuffer.getUShort("head", 0);
+    recordCount = recordBuffer.getUShort("count", 0);
+    frameSequence = recordBuffer.getULong("seq", 0);
+}
+
+void recordKey(uint16_t slot, char* key, size_t size) {
+    snprintf(key, size, "r%u", slot);
+}
+
+void storeRecord(const LoggedRecord& record) {
+    char key[8];
+    recordKey((recordHead + recordCount) % RECORD_BUFFER_SIZE, key, sizeof(key));
+    recordBuffer.putBytes(key, &record, sizeof(record));
+    if (recordCount < RECORD_BUFFER_SIZE) {
+        recordCount++;
+        recordBuffer.putUShort("count", recordCount);
+    } else {
+        // Full: the slot just written held the oldest record
+        recordHead = (recordHead + 1) % RECORD_BUFFER_SIZE;
+        recordBuffer.putUShort("head", recordHead);
+    }
+    recordBuffer.putULong("seq", record.seq);
+}
+
+void dumpRecords() {
+    char payload[32];
+    snprintf(payload, sizeof(payload), "D,BEGIN,%u", recordCount);
+    sendFrame(payload);
+
+    uint16_t sent = 0;
+    LoggedRecord record;
+    char key[8];
+    for (uint16_t i = 0; i < recordCount; i++) {
+        recordKey((recordHead + i) % RECORD_BUFFER_SIZE, key, sizeof(key));
+        if (recordBuffer.getBytes(key, &record, sizeof(record)) != sizeof(record)) continue;
+        sendCompactFrame('R', record.seq, record.date, record.time, record.weightKg);
+        sent++;
+    }
+    snprintf(payload, sizeof(payload), "D,END,%u", sent);
+    sendFrame(payload);
+}
+
+void clearRecords() {
+    recordHead = 0;
+    recordCount = 0;
+    recordBuffer.putUShort("head", recordHead);
+    recordBuffer.putUShort("count", recordCount);
+    sendFrame("D,CLEARED");
+}
+
+void handleSerialCommands() {
+    while (Serial.available()) {
+        char c = Serial.read();
+        if (c == '\n' || c == '\r') {
+            commandLine.trim();
+            if (commandLine == "DUMP") dumpRecords();
+            else if (commandLine == "CLEAR") clearRecords();
+            commandLine = "";
+        } else if (commandLine.length() < 16) {
+            commandLine += c;
+        }
+    }
+}
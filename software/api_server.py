@@ -0,0 +1,217 @@
+import asyncio
+import ipaddress
+import json
+import queue
+import threading
+from aiohttp import web, WSMsgType, WSCloseCode
+from metrics import METRICS
+
+# --- Endpoints ---
+# GET  /api/scales                   Ports and their latest reading
+# GET  /api/collectors?q=<text>      Type-ahead search over the collector list
+# POST /api/transactions             {"scale", "collector", "category", "material",
+#                                     "packaging", "allow_zero"}; registers the
+#                                     current weight of that scale
+# GET  /ws?scale=<port>              WebSocket stream of weight and stability frames
+# GET  /metrics                      Timing histograms (Prometheus text format)
+#
+# If a token is configured, requests must send "Authorization: Bearer <token>"
+# or "?token=<token>" (browsers cannot set headers on WebSockets). Anyone who
+# reaches the API can register weighings, so it only listens beyond this PC
+# (a host other than 127.0.0.1/localhost) when a token is set.
+
+def is_loopback(host):
+    if host == "localhost": return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def check_listen_address(host, token):
+    """
+    Raises ValueError if `host` is reachable from the network and no
+    token is set. Also used by the sync server (station_sync.py serve).
+    """
+    if not token and not is_loopback(host):
+        raise ValueError(f"Refusing to listen on {host} without a token; set a token or use 127.0.0.1.")
+
+class ScaleChannel:
+    """
+    Latest frame of one scale. A frame is serialized once when published and
+    the same bytes are sent to every subscriber. Subscribers that fall behind
+    skip to the newest frame instead of queuing old ones.
+    """
+    def __init__(self):
+        self.frame = None
+        self.state = None
+        self.version = 0
+        self.changed = asyncio.Event()
+
+    def publish(self, state, frame):
+        # Runs in the server loop
+        self.state = state
+        self.frame = frame
+        self.version += 1
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+class LiveServer:
+    """
+    HTTP/WebSocket server running its own asyncio loop in a daemon thread.
+    `publish()` may be called from any thread. `submit(payload)` is called
+    from the server thread and returns a ticket number; it raises ValueError
+    for invalid transactions and queue.Full when the writer is busy.
+    `search_collectors(query, limit)` returns matching names.
+    """
+    def __init__(self, host, port, scales, submit, search_collectors, token=""):
+        check_listen_address(host, token)
+        self.host = host
+        self.port = port
+        self.scale_ids = list(scales)
+        self.submit = submit
+        self.search_collectors = search_collectors
+        self.token = token
+        self.loop = None
+        self.channels = {}
+        self.runner = None
+        self.sockets = set()  # Open /ws connections, closed on shutdown
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        self.ready.wait(5)
+
+    def stop(self):
+        if self.loop and self.loop.is_running():
+            # Never raise here: the app still has to flush and close after this
+            try:
+                asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(5)
+            except Exception as e:
+                print(f"API Server Error: {e}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+
+    def publish(self, scale, state):
+        """
+        Sends `state` (a dict) to the subscribers of `scale`.
+        """
+        if self.loop is None: return
+        frame = json.dumps(dict(state, scale=scale), separators=(",", ":")).encode("utf-8")
+        self.loop.call_soon_threadsafe(self._publish, scale, state, frame)
+
+    def _publish(self, scale, state, frame):
+        channel = self.channels.get(scale)
+        if channel is not None:
+            channel.publish(state, frame)
+
+    # --- Server Loop ---
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.channels = {scale: ScaleChannel() for scale in self.scale_ids}
+            self.loop.run_until_complete(self._start())
+            print(f"API server listening on http://{self.host}:{self.port}")
+        except Exception as e:
+            print(f"API Server Error: {e}")
+            self.ready.set()
+            return
+        self.ready.set()
+        self.loop.run_forever()
+        self.loop.close()
+
+    async def _start(self):
+        app = web.Application(middlewares=[self._auth])
+        app.add_routes([
+            web.get("/api/scales", self.handle_scales),
+            web.get("/api/collectors", self.handle_collectors),
+            web.post("/api/transactions", self.handle_transaction),
+            web.get("/ws", self.handle_ws),
+            web.get("/metrics", self.handle_metrics),
+        ])
+        app.on_shutdown.append(self._close_sockets)
+        self.runner = web.AppRunner(app, shutdown_timeout=1)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    async def _shutdown(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+    async def _close_sockets(self, app):
+        # Open WebSockets would otherwise keep cleanup() waiting on their handlers
+        for ws in list(self.sockets):
+            await ws.close(code=WSCloseCode.GOING_AWAY, message=b"Server shutdown")
+
+    @web.middleware
+    async def _auth(self, request, handler):
+        if self.token:
+            header = request.headers.get("Authorization", "")
+            if header != f"Bearer {self.token}" and request.query.get("token") != self.token:
+                return web.json_response({"error": "Unauthorized."}, status=401)
+        return await handler(request)
+
+    # --- Handlers ---
+
+    async def handle_scales(self, request):
+        return web.json_response([
+            dict(channel.state or {}, scale=scale) for scale, channel in self.channels.items()
+        ])
+
+    async def handle_collectors(self, request):
+        try:
+            limit = int(request.query.get("limit", 30))
+        except ValueError:
+            limit = 30
+        return web.json_response(self.search_collectors(request.query.get("q", ""), limit))
+
+    async def handle_transaction(self, request):
+        try:
+            payload = await request.json()
+        except ValueError:
+            return web.json_response({"error": "Body must be JSON."}, status=400)
+        if not isinstance(payload, dict):
+            return web.json_response({"error": "Body must be a JSON object."}, status=400)
+        try:
+            ticket = self.submit(payload)
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        except queue.Full:
+            return web.json_response({"error": "Too many transactions are waiting to be saved. Try again in a moment."}, status=503)
+        return web.json_response({"ticket": ticket}, status=202)
+
+    async def handle_metrics(self, request):
+        return web.Response(text=METRICS.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+    async def handle_ws(self, request):
+        channel = self.channels.get(request.query.get("scale", ""))
+        if channel is None:
+            return web.json_response({"error": "Unknown scale."}, status=404)
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        self.sockets.add(ws)
+
+        sender = asyncio.ensure_future(self._send_frames(ws, channel))
+        try:
+            # Incoming messages are ignored; reading handles pings and close
+            async for msg in ws:
+                if msg.type == WSMsgType.ERROR: break
+        finally:
+            sender.cancel()
+            self.sockets.discard(ws)
+        return ws
+
+    async def _send_frames(self, ws, channel):
+        seen = 0
+        while not ws.closed:
+            changed = channel.changed
+            if channel.version != seen:
+                seen = channel.version
+                try:
+                    await ws.send_frame(channel.frame, WSMsgType.TEXT)
+                except ConnectionResetError:
+                    return
+                continue
+            await changed.wait()
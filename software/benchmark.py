@@ -0,0 +1,322 @@
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+import openpyxl
+from bulk_ingest import build_entries, ingest, parse_records
+from catalog import CATALOG
+from collectors import CollectorIndex, load_collectors
+from headless import transaction_defaults
+from journal import TransactionJournal
+from log_writer import ExcelLogWriter, build_log_headers, sheet_title_for_date
+from save_pipeline import SaveWorker, STATUS_SAVED
+from scale_simulator import ScaleSimulator, serve_pty, serve_tcp
+from serial_protocol import ProtocolParser, build_frame
+from serial_reader import read_serial_data
+from station_sync import ConsolidatedStore, FolderTarget, merge_folder, push
+
+# --- Benchmarks ---
+# Results are a flat {metric: value} map written as JSON. Metric names end
+# in "_s" (seconds, lower is better) or "_per_s" (higher is better), before
+# an optional "[size]" suffix; that is how --baseline decides whether a
+# change is a regression.
+#
+#   python benchmark.py --out results.json
+#   python benchmark.py --sizes 1000,100000,500000 --baseline results.json
+
+def sample_entry(day, collector, material="ALUMINUM"):
+    return {
+        "date": day.strftime("%d/%m/%Y"), "collector": collector, "collector_id": "N/A",
+        "category": "Metals", "material": material, "packaging": "None",
+        "gross_weight": 10.0, "tare": 0.0, "net_weight": 10.0, "scale": "BENCH",
+    }
+
+def timed(func, repeat=1):
+    """
+    Median wall time of `repeat` calls.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+def bench_parser(results, lines=200000):
+    """
+    Parser throughput for each line format the firmware sends (the parsing
+    done by the serial reader thread, without the Tk refresh).
+    """
+    samples = {
+        "text": b"Date: 12/12/2025, Weight: 10.50\r",
+        "weight_only": b"10.50\r",
+        "frame": build_frame(b"W,42,12/12/2025,10:15:00,10.50") + b"\r",
+    }
+    for name, line in samples.items():
+        parser = ProtocolParser()
+        single = [[line]] * lines
+        batch = [line] * 1000
+        elapsed = timed(lambda: [parser.coalesce(raw) for raw in single])
+        results[f"parser.{name}_lines_per_s"] = lines / elapsed
+        elapsed = timed(lambda: [parser.coalesce(batch) for _ in range(lines // 1000)])
+        results[f"parser.{name}_burst1000_lines_per_s"] = lines / elapsed
+
+def make_log(file_name, rows, rows_per_sheet=5000):
+    """
+    Writes a log with `rows` rows, spread over monthly sheets going back
+    from this month.
+    """
+    headers = build_log_headers(CATALOG.get().log_schedule)
+    wb = openpyxl.Workbook(write_only=True)
+    day = date.today().replace(day=1)
+    written = 0
+    while written < rows:
+        ws = wb.create_sheet(sheet_title_for_date(day.strftime("%d/%m/%Y")))
+        ws.append(headers)
+        for i in range(min(rows_per_sheet, rows - written)):
+            values = [0.0] * (len(headers) - 4)
+            values[i % len(values)] = 10.0
+            ws.append([day.strftime("%d/%m/%Y"), f"COLLECTOR {i}", "N/A"] + values + [10.0])
+        written += rows_per_sheet
+        day = (day - timedelta(days=1)).replace(day=1)
+    wb.save(file_name)
+
+def bench_excel(results, work_dir, sizes, repeat):
+    """
+    append_data_to_excel (load + save per transaction) and ExcelLogWriter
+    (in-memory append, periodic flush) against the size of the log.
+    """
+    from recycling_app import append_data_to_excel  # Pulls in the GUI modules
+    for rows in sizes:
+        base = os.path.join(work_dir, f"log_{rows}.xlsx")
+        make_log(base, rows)
+        file_name = os.path.join(work_dir, "log_work.xlsx")
+        shutil.copyfile(base, file_name)
+        today = date.today()
+
+        results[f"excel.append_data_to_excel_s[{rows}]"] = timed(
+            lambda: append_data_to_excel(file_name, sample_entry(today, "BENCH COLLECTOR")), repeat
+        )
+
+        shutil.copyfile(base, file_name)
+        writer = ExcelLogWriter(file_name, flush_every=10 ** 9, flush_interval=10 ** 9, material_schedule=CATALOG.get().log_schedule)
+        results[f"excel.writer_first_append_s[{rows}]"] = timed(lambda: writer.append(sample_entry(today, "BENCH COLLECTOR")))
+        entries = [sample_entry(today, f"BENCH {i}") for i in range(1000)]
+        results[f"excel.writer_append_s[{rows}]"] = timed(lambda: [writer.append(e) for e in entries]) / len(entries)
+        results[f"excel.writer_flush_s[{rows}]"] = timed(writer.flush)
+        writer.close()
+        os.remove(base)
+
+def bench_collectors(results, work_dir, count=5000, queries=2000):
+    file_name = os.path.join(work_dir, "collectors.xlsx")
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Collectors")
+    ws.append(["Collector_Name", "Collector_ID"])
+    for i in range(count):
+        ws.append([f"Collector {i} Example", str(100000000 + i)])
+    wb.save(file_name)
+
+    collectors = {}
+    results[f"collectors.load_s[{count}]"] = timed(lambda: collectors.update(load_collectors(file_name)), 3)
+    index = CollectorIndex(collectors)
+    results[f"collectors.index_build_s[{count}]"] = timed(lambda: CollectorIndex(collectors), 3)
+    words = ["col", "12", "ample", "collector 4", "1000012"]
+    results["collectors.search_per_s"] = queries / timed(lambda: [index.search(words[i % len(words)]) for i in range(queries)])
+
+def bench_bulk_ingest(results, work_dir, records=20000):
+    """
+    Buffered records applied in one pass, and the same dump ingested again
+    (everything is a duplicate).
+    """
+    day = date.today()
+    lines = [
+        build_frame(b"R,%d,%s,%02d:%02d:%02d,%.2f" % (i, day.strftime("%d/%m/%Y").encode(), i // 3600 % 24, i // 60 % 60, i % 60, 1 + i % 50))
+        for i in range(records)
+    ]
+    journal = TransactionJournal(os.path.join(work_dir, "bulk_journal.db"))
+    writer = ExcelLogWriter(os.path.join(work_dir, "bulk_log.xlsx"), material_schedule=CATALOG.get().log_schedule)
+    entries, keys = build_entries(parse_records(lines), "BENCH", transaction_defaults("ALUMINUM"))
+    results[f"bulk_ingest.records_per_s[{records}]"] = records / timed(lambda: ingest(entries, keys, journal, writer))
+    results[f"bulk_ingest.duplicates_per_s[{records}]"] = records / timed(lambda: ingest(entries, keys, journal, writer))
+    writer.close()
+    journal.close()
+
+def bench_sync(results, work_dir, stations=20, history=10000, delta=2000):
+    """
+    Consolidating `stations` stations: each pushes a delta of `delta`
+    transactions into a shared folder holding `history` earlier ones per
+    station, which is then merged. Merge time should not grow with history.
+    """
+    sync_dir = os.path.join(work_dir, "sync")
+    store = ConsolidatedStore(os.path.join(work_dir, "consolidated.db"))
+    target = FolderTarget(sync_dir)
+    day = date.today()
+    journals = []
+    for s in range(stations):
+        journal = TransactionJournal(os.path.join(work_dir, f"station_{s}.db"))
+        journal.append_many([sample_entry(day, f"COLLECTOR {i % 500}") for i in range(history)])
+        push(journal, f"STATION-{s}", target)
+        journals.append(journal)
+    merge_folder(store, sync_dir)
+
+    for journal in journals:
+        journal.append_many([sample_entry(day, f"COLLECTOR {i % 500}") for i in range(delta)])
+    results[f"sync.push_s[{delta}]"] = timed(lambda: push(journals[0], "STATION-0", target))
+    for s, journal in enumerate(journals[1:], start=1):
+        push(journal, f"STATION-{s}", target)
+    inbox = os.path.join(sync_dir, "inbox")
+    size = sum(os.path.getsize(os.path.join(inbox, name)) for name in os.listdir(inbox))
+    results[f"sync.delta_bytes_per_transaction[{delta}]"] = size / (stations * delta)
+    results[f"sync.merge_{stations}_stations_s[{delta}]"] = timed(lambda: merge_folder(store, sync_dir))
+    for journal in journals:
+        journal.close()
+    store.close()
+
+class EndToEndHarness:
+    """
+    Stand-in for the application: logged weighings read by read_serial_data
+    are submitted to a SaveWorker, and the time from the simulator sending
+    the line to the "saved" status is recorded.
+    """
+    def __init__(self, work_dir, weighings):
+        self.running = True
+        self.weighings = weighings
+        self.sent_at = []
+        self.latencies = []
+        self.done = threading.Event()
+        self.journal = TransactionJournal(os.path.join(work_dir, "bench_journal.db"))
+        self.writer = ExcelLogWriter(os.path.join(work_dir, "bench_log.xlsx"), material_schedule=CATALOG.get().log_schedule)
+        self.worker = SaveWorker(self.journal, self.writer, self.on_status)
+        self.worker.start()
+
+    def on_sent(self, data):
+        if b"Date" in data:
+            self.sent_at.append(time.perf_counter())
+
+    def process_reading(self, date_str, weight, weighings=()):
+        for weighing in weighings:
+            self.worker.submit(sample_entry(date.today(), "BENCH COLLECTOR") | {"gross_weight": weighing.weight, "net_weight": weighing.weight})
+
+    def on_status(self, ticket, status, message):
+        if status == STATUS_SAVED:
+            self.latencies.append(time.perf_counter() - self.sent_at[ticket - 1])
+            if len(self.latencies) >= self.weighings:
+                self.done.set()
+
+    def report_serial_error(self, port):
+        self.done.set()
+
+    def close(self):
+        self.running = False
+        self.worker.stop(30)
+        self.journal.close()
+
+def bench_end_to_end(results, work_dir, weighings=50, rate=200.0):
+    """
+    Runs over a pseudo-terminal where available, so the reader sees bursts
+    as on a real port. Over TCP (Windows) pyserial reports at most one
+    waiting byte and the reader takes one byte per read.
+    """
+    harness = EndToEndHarness(work_dir, weighings)
+    simulator = ScaleSimulator(rate=rate, settle_s=0.05, seed=1)
+    source = simulator.lines(weighings)
+    if hasattr(os, "openpty"):
+        # A device path makes the reader wait 2 s for the ESP32 reset before reading
+        source = itertools.chain([(3.0, b"")], source)
+    ready = threading.Event()
+    ports = []
+    callbacks = {"on_ready": lambda port: (ports.append(port), ready.set()), "on_sent": harness.on_sent}
+    if hasattr(os, "openpty"):
+        server = threading.Thread(target=serve_pty, args=(source,), kwargs=callbacks, daemon=True)
+    else:
+        server = threading.Thread(target=serve_tcp, args=(source, 0), kwargs=callbacks, daemon=True)
+    server.start()
+    ready.wait(5)
+    reader = threading.Thread(target=read_serial_data, args=(ports[0], 115200, harness), daemon=True)
+    reader.start()
+    harness.done.wait(60)
+    harness.close()
+
+    if harness.latencies:
+        latencies = sorted(harness.latencies)
+        results["end_to_end.weigh_to_saved_median_s"] = statistics.median(latencies)
+        results["end_to_end.weigh_to_saved_p95_s"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the metrics that are more than `tolerance` (fraction) worse than
+    in `baseline`.
+    """
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if not old: continue
+        if name.split("[", 1)[0].endswith("_per_s"):
+            worse = value < old * (1 - tolerance)
+        else:
+            worse = value > old * (1 + tolerance)
+        if worse:
+            regressions.append((name, old, value))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the ingest-to-disk path.")
+    parser.add_argument("--only", nargs="*", choices=["parser", "excel", "collectors", "bulk_ingest", "sync", "end_to_end"], help="Run only these groups")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Log sizes (rows) for the Excel benchmarks, comma separated")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", help="Write the results to this JSON file (default: stdout)")
+    parser.add_argument("--baseline", help="Results file to compare with; exits with 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    groups = args.only or ["parser", "excel", "collectors", "bulk_ingest", "sync", "end_to_end"]
+
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix="recycling_bench_")
+    # Progress messages of the modules under test go to stderr, away from the JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            if "parser" in groups: bench_parser(results)
+            if "excel" in groups: bench_excel(results, work_dir, [int(s) for s in args.sizes.split(",")], args.repeat)
+            if "collectors" in groups: bench_collectors(results, work_dir)
+            if "bulk_ingest" in groups: bench_bulk_ingest(results, work_dir)
+            if "sync" in groups: bench_sync(results, work_dir)
+            if "end_to_end" in groups: bench_end_to_end(results, work_dir)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "materials": len(CATALOG.get().schedule),
+            "catalog_version": CATALOG.get().version,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        for name, old, new in regressions:
+            print(f"REGRESSION {name}: {old:.6g} -> {new:.6g}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import argparse
+import time
+from collections import namedtuple
+import serial
+from config import EXCEL_LOG_FILE, LOG_SHARDING, JOURNAL_FILE, BAUD_RATE, LOG_FLUSH_EVERY, LOG_FLUSH_INTERVAL_S
+from catalog import CATALOG
+from headless import transaction_defaults
+from journal import TransactionJournal
+from log_shards import import_log_history, open_log_writer
+from scale_simulator import replay_lines
+from serial_protocol import FRAME_RE, ProtocolParser, frame_checksum
+
+# --- Bulk Ingest ---
+# The scale controller keeps every logged weighing in a record buffer (see
+# the firmware), so weighings made while the PC was off can be collected
+# later and applied in one pass:
+#
+#   python bulk_ingest.py --port COM3 --material PET --clear
+#   python bulk_ingest.py --file dump.txt --scale COM3 --material PET
+#
+# The buffer also holds the weighings the application received live. The
+# journal keeps the highest firmware sequence number received live from each
+# scale (its live mark), and records up to it are skipped; the scale name
+# (--scale, default --port) must match the port the application used.
+# Records with a time ("$R"/"$W" frames) are keyed by scale and date/time in
+# the journal, so the same dump can be ingested any number of times. Text
+# lines carry no time and cannot be told apart from another weighing of the
+# same weight that day: they are skipped unless --untimed is given, and are
+# then stored on every run. The log workbook is loaded and saved once per
+# run. Close the application first: it holds the port and the log.
+
+DUMP_COMMAND = b"DUMP\n"
+CLEAR_COMMAND = b"CLEAR\n"
+DUMP_WEIGHING_TYPES = (b"W", b"R")  # Live weighings (in captures) and buffered records
+
+BufferedRecord = namedtuple("BufferedRecord", ["date", "time", "weight", "seq"])
+
+def parse_control(raw):
+    """
+    Fields of a valid "$D,..." frame ([b"D", b"BEGIN", b"12"]), else None.
+    """
+    m = FRAME_RE.fullmatch(raw.strip())
+    if not m: return None
+    payload, checksum = m.groups()
+    if not payload.startswith(b"D,") or frame_checksum(payload) != int(checksum, 16):
+        return None
+    return payload.split(b",")
+
+def parse_records(lines, parser=None):
+    """
+    Logged weighings in a dump or a capture: "$R"/"$W" frames (with time)
+    and "Date: ..., Weight: ..." text lines (without time). Streamed
+    readings and damaged lines are skipped.
+    """
+    parser = parser if parser is not None else ProtocolParser()
+    records = []
+    for raw in lines:
+        reading = parser.parse(raw, DUMP_WEIGHING_TYPES)
+        if reading is None or reading.date is None or reading.weight is None: continue
+        records.append(BufferedRecord(reading.date, reading.time, reading.weight, reading.seq))
+    return records
+
+def read_dump_file(file_name):
+    """
+    Lines of a saved dump, a capture ("seconds<TAB>line") or a text file.
+    """
+    return [line for _, line in replay_lines(file_name)]
+
+# --- Scale Commands ---
+
+def open_scale(port, baud_rate=BAUD_RATE):
+    ser = serial.serial_for_url(port, baud_rate, timeout=1)
+    if "://" not in port:
+        time.sleep(2)  # Opening the port resets the ESP32; commands wait in its input buffer
+    ser.reset_input_buffer()
+    return ser
+
+def request_dump(ser, timeout=15.0):
+    """
+    Sends DUMP and returns (lines, complete). Only the lines between the
+    BEGIN and END frames are returned; `complete` is False if a record was
+    lost on the way (END count differs) or END never came.
+    """
+    ser.write(DUMP_COMMAND)
+    lines, started = [], False
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        raw = ser.readline()
+        if not raw: continue
+        control = parse_control(raw)
+        if control and control[1] == b"BEGIN":
+            lines, started = [], True
+        elif control and control[1] == b"END" and started:
+            sent = int(control[2]) if len(control) > 2 and control[2].isdigit() else -1
+            return lines, sent == len(parse_records(lines))
+        elif started:
+            lines.append(raw)
+    return lines, False
+
+def clear_buffer(ser, timeout=5.0):
+    """
+    Empties the record buffer. Returns True once the scale confirmed it.
+    """
+    ser.write(CLEAR_COMMAND)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        control = parse_control(ser.readline())
+        if control and control[1] == b"CLEARED":
+            return True
+    return False
+
+# --- Ingest ---
+
+def build_entries(records, scale, defaults):
+    """
+    Returns (entries, keys) for journal.append_new(). Records with a time
+    are keyed by "dd/mm/yyyy hh:mm:ss"; text lines have no time, so their
+    key is None and they are not deduplicated.
+    """
+    entries, keys = [], []
+    for record in records:
+        entry = dict(defaults)
+        entry.update({
+            "date": record.date,
+            "gross_weight": record.weight,
+            "net_weight": round(record.weight - entry["tare"], 2),
+            "scale": scale,
+        })
+        entries.append(entry)
+        keys.append((scale, f"{record.date} {record.time}") if record.time else None)
+    return entries, keys
+
+def skip_live_records(records, live_mark):
+    """
+    Returns (records, skipped): the records newer than `live_mark`. Records
+    without a sequence number are kept.
+    """
+    kept = [r for r in records if r.seq is None or r.seq > live_mark]
+    return kept, len(records) - len(kept)
+
+def ingest(entries, keys, journal, log_writer):
+    """
+    Stores the entries not ingested before and applies them to the log with
+    a single save. Returns the number of new entries. If the save fails they
+    stay in the journal and the log's pending queue for the next run.
+    """
+    new_entries = journal.append_new(entries, keys)
+    if new_entries:
+        log_writer.append_many(new_entries)
+        log_writer.flush()
+    return len(new_entries)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Apply weighings buffered by the scale while the PC was off.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--port", help="Serial port of the scale; its buffer is read with the DUMP command")
+    source.add_argument("--file", help="Saved dump or capture file")
+    parser.add_argument("--scale", help="Scale name recorded with the weighings (default: --port)")
+    parser.add_argument("--baud", type=int, default=BAUD_RATE)
+    parser.add_argument("--timeout", type=float, default=15.0, help="Seconds to wait for the dump")
+    parser.add_argument("--clear", action="store_true", help="Empty the scale's buffer after a complete dump was saved")
+    parser.add_argument("--ignore-live-mark", action="store_true",
+                        help="Also ingest records up to the highest sequence number received live (e.g. after the controller's memory was erased)")
+    parser.add_argument("--untimed", action="store_true",
+                        help="Also store text lines without a time; they are not deduplicated, so ingest such a file only once")
+    parser.add_argument("--material", required=True, help="Material recorded for every weighing")
+    parser.add_argument("--collector", default="UNASSIGNED")
+    parser.add_argument("--collector-id", default="N/A")
+    parser.add_argument("--packaging", default="None", choices=list(CATALOG.get().tares))
+    parser.add_argument("--log-file", default=EXCEL_LOG_FILE)
+    parser.add_argument("--journal", default=JOURNAL_FILE)
+    args = parser.parse_args(argv)
+
+    args.material = args.material.upper()
+    if args.material not in CATALOG.get().material_categories:
+        parser.error(f"unknown material '{args.material}'")
+    if args.file and not args.scale:
+        parser.error("--scale is required with --file")
+    if args.clear and not args.port:
+        parser.error("--clear needs --port")
+    args.scale = args.scale or args.port
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    ser = None
+    complete = True
+    if args.port:
+        ser = open_scale(args.port, args.baud)
+        print(f"Reading the record buffer of {args.port}...")
+        lines, complete = request_dump(ser, args.timeout)
+        if not complete:
+            print("Warning: the dump is incomplete; the buffer will not be cleared.")
+    else:
+        lines = read_dump_file(args.file)
+
+    records = parse_records(lines)
+    untimed = sum(1 for record in records if not record.time)
+    if untimed and not args.untimed:
+        print(f"Skipping {untimed} text line(s) without a time; use --untimed to store them (once).")
+        records = [record for record in records if record.time]
+
+    journal = TransactionJournal(args.journal)
+    live_mark = 0 if args.ignore_live_mark else journal.live_mark(args.scale)
+    highest = max((r.seq for r in records if r.seq is not None), default=None)
+    records, skipped = skip_live_records(records, live_mark)
+    if skipped:
+        print(f"Skipping {skipped} record(s) up to #{live_mark}, already received live by the application.")
+    if highest is not None and highest < live_mark:
+        print(f"Warning: the scale's sequence numbers end at #{highest}, below #{live_mark}; use --ignore-live-mark if its memory was erased.")
+
+    entries, keys = build_entries(records, args.scale, transaction_defaults(args.material, args.collector, args.collector_id, args.packaging))
+    import_log_history(journal, args.log_file)
+    log_writer = open_log_writer(args.log_file, LOG_SHARDING, LOG_FLUSH_EVERY, LOG_FLUSH_INTERVAL_S, CATALOG.get().log_schedule)
+    saved = False
+    try:
+        log_writer.recover()
+        start = time.perf_counter()
+        added = ingest(entries, keys, journal, log_writer)
+        elapsed = time.perf_counter() - start
+        saved = True
+        print(f"{len(records)} record(s) read, {added} new, {len(records) - added} already stored ({elapsed:.2f} s).")
+    except Exception as e:
+        print(f"Bulk Ingest Error: {e}")
+    finally:
+        try:
+            log_writer.close()
+        except Exception as e:
+            print(f"Excel Write Error: {e}")
+        journal.close()
+
+    if ser is not None:
+        if args.clear and saved and complete:
+            print("Record buffer cleared." if clear_buffer(ser) else "Warning: the scale did not confirm CLEAR.")
+        ser.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import json
+from config import CATALOG_FILE, CATALOG_SITE, LOG_LAYOUT, MATERIALS_BY_CATEGORY, PACKAGING_WEIGHTS
+from watched_file import WatchedFile
+
+# --- Catalog File ---
+# Materials and packaging come from a JSON file, so sites can change them
+# without editing the code:
+#
+#   {
+#     "version": 3,
+#     "categories": {"Metals": ["Aluminum", "Copper"], "Plastics": ["PET"]},
+#     "packaging": {"None": 0.0, "Burlap Bag": 1.5},
+#     "site_tares": {"North Yard": {"Burlap Bag": 1.7}}
+#   }
+#
+# "site_tares" overrides (or adds) tares for the site named by CATALOG_SITE.
+# Without the file, the built-in tables in config.py are used.
+
+def default_catalog_data():
+    return {"version": 0, "categories": MATERIALS_BY_CATEGORY, "packaging": PACKAGING_WEIGHTS, "site_tares": {}}
+
+def validate_catalog_data(data):
+    """
+    Raises ValueError with the first problem found in a catalog dict.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("The catalog must be a JSON object.")
+    if not isinstance(data.get("version", 0), int):
+        raise ValueError("'version' must be an integer.")
+    categories = data.get("categories")
+    if not isinstance(categories, dict) or not categories:
+        raise ValueError("'categories' must map category names to lists of materials.")
+    for category, materials in categories.items():
+        if not isinstance(materials, list) or not all(isinstance(m, str) and m.strip() for m in materials):
+            raise ValueError(f"Materials of '{category}' must be a list of names.")
+    tables = [("packaging", data.get("packaging"))]
+    site_tares = data.get("site_tares", {})
+    if not isinstance(site_tares, dict):
+        raise ValueError("'site_tares' must map site names to packaging tares.")
+    tables += [(f"site_tares/{site}", tares) for site, tares in site_tares.items()]
+    for name, tares in tables:
+        if not isinstance(tares, dict) or \
+           not all(isinstance(kg, (int, float)) and not isinstance(kg, bool) and kg >= 0 for kg in tares.values()):
+            raise ValueError(f"'{name}' must map packaging names to tares in kg (0 or more).")
+    if not data["packaging"]:
+        raise ValueError("'packaging' must list at least one packaging.")
+
+class Catalog:
+    """
+    Lookup tables built once from a catalog, so registering a transaction
+    only does dict lookups. Never modified after it is built; a reload
+    builds a new one.
+    `previous` keeps the column slots of materials already known, so
+    new sheets keep the same column order after a reload.
+    """
+    def __init__(self, data, site="", previous=None):
+        validate_catalog_data(data)
+        self.version = data.get("version", 0)
+        self.site = site
+        self.categories = {category: tuple(materials) for category, materials in data["categories"].items()}
+
+        self.logged_names = {}          # (category, material as listed) -> name in the log ("ALUMINUM")
+        self.material_categories = {}   # Name in the log -> category
+        self.material_slots = dict(previous.material_slots) if previous else {}  # Name in the log -> column slot
+        for category, materials in self.categories.items():
+            for material in materials:
+                logged = material.strip().upper()
+                self.logged_names[(category, material)] = logged
+                self.material_categories.setdefault(logged, category)
+                self.material_slots.setdefault(logged, len(self.material_slots))
+        # Removed materials keep their slot, so later slots do not move
+        self.schedule = sorted(self.material_slots, key=self.material_slots.get)
+
+        self.tares = {name: float(kg) for name, kg in data["packaging"].items()}
+        site_tares = data.get("site_tares", {})
+        if site and site not in site_tares:
+            print(f"Catalog Warning: no tares for site '{site}'; using the standard tares.")
+        self.tares.update((name, float(kg)) for name, kg in site_tares.get(site, {}).items())
+
+    @property
+    def log_schedule(self):
+        """
+        Column schedule for new log sheets (see build_log_headers).
+        """
+        return self.schedule if LOG_LAYOUT == "fixed" else None
+
+# --- Cached Catalog ---
+
+class CatalogFile(WatchedFile):
+    """
+    The current Catalog of a catalog file. Like CollectorDirectory, it is a
+    WatchedFile: the file is only read again when it changes, and changes
+    are reported through `on_change(catalog)`. A file with errors is
+    reported and the last good catalog is kept.
+    """
+    watcher_name = "Catalog"
+
+    def __init__(self, file_name, site=""):
+        super().__init__(file_name)
+        self.site = site
+        self.catalog = None
+
+    def get(self):
+        catalog = self.catalog
+        if catalog is None:
+            self.refresh()
+            catalog = self.catalog
+        return catalog
+
+    def refresh(self, force=False):
+        """
+        Reloads the file if it changed (or if `force`). Returns True when a
+        new catalog was loaded.
+        """
+        with self.lock:
+            signature = self._file_signature()
+            if self.catalog is not None and signature == self.signature and not force:
+                return False
+            self.signature = signature
+            try:
+                if signature is None:
+                    data = default_catalog_data()
+                else:
+                    with open(self.file_name, encoding="utf-8") as f:
+                        data = json.load(f)
+                catalog = Catalog(data, self.site, self.catalog)
+            except (OSError, ValueError) as e:
+                print(f"Catalog Error in '{self.file_name}': {e}")
+                if self.catalog is not None:
+                    return False
+                catalog = Catalog(default_catalog_data(), self.site)
+            self.catalog = catalog
+            print(f"Catalog version {catalog.version} loaded: {len(catalog.material_categories)} materials, {len(catalog.tares)} packaging types.")
+            return True
+
+# Shared by all modules; loaded on first use
+CATALOG = CatalogFile(CATALOG_FILE, CATALOG_SITE)
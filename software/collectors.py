@@ -0,0 +1,165 @@
+import os
+from bisect import bisect_left
+import openpyxl
+from watched_file import WatchedFile
+
+# --- Collectors Database ---
+
+def create_collectors_db(file_name, sheet_name="Collectors"):
+    """
+    Creates the collectors workbook with an example row if it does not exist.
+    """
+    if os.path.exists(file_name):
+        return True
+    try:
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = sheet_name
+        ws.append(["Collector_Name", "Collector_ID"])
+        ws.append(["Example Collector 1", "123456789"])
+        wb.save(file_name)
+        return True
+    except Exception as e:
+        print(f"Error creating Excel database ('{file_name}'): {e}")
+        return False
+
+def load_collectors(file_name, sheet_name="Collectors"):
+    """
+    Reads name -> ID from the collectors workbook. Uses openpyxl's read-only
+    mode, which streams the rows instead of building the whole sheet.
+    """
+    wb = openpyxl.load_workbook(file_name, read_only=True, data_only=True)
+    try:
+        collectors_dict = {}
+        if sheet_name in wb.sheetnames:
+            for name_cell, id_cell in wb[sheet_name].iter_rows(min_row=2, max_col=2, values_only=True):
+                if name_cell:
+                    name = str(name_cell).strip()
+                    collector_id = str(id_cell).strip() if id_cell else "N/A"
+                    collectors_dict[name] = collector_id
+        return collectors_dict
+    finally:
+        wb.close()
+
+def manage_collectors_db(operation, file_name, sheet_name="Collectors"):
+    """
+    Creates or reads the database of waste collectors (recyclers).
+    Operations: "create" and "read".
+    """
+    if not create_collectors_db(file_name, sheet_name):
+        return {"Error": "N/A"}
+
+    if operation == "read":
+        try:
+            collectors_dict = load_collectors(file_name, sheet_name)
+            return collectors_dict if collectors_dict else {"Empty List": "N/A"}
+        except Exception as e:
+            print(f"Error reading Excel ('{file_name}'): {e}")
+            return {"Error": "N/A"}
+
+# --- Type-ahead Index ---
+
+class CollectorIndex:
+    """
+    Type-ahead index over collector names and IDs. Prefixes (of the name,
+    of each word in it, and of the ID) are found with bisect over a sorted
+    key array; longer substrings go through a trigram index. A query only
+    touches matching entries, so it stays fast for large rosters.
+    """
+    def __init__(self, collectors):
+        self.names = sorted(collectors.keys(), key=str.lower)
+        self.search_text = []
+        self.trigrams = {}
+        keys = []
+
+        for idx, name in enumerate(self.names):
+            lowered = name.lower()
+            collector_id = str(collectors[name]).strip().lower()
+            if collector_id == "n/a": collector_id = ""
+
+            keys.append((lowered, idx))
+            for pos, char in enumerate(lowered):
+                if char == " " and pos + 1 < len(lowered):
+                    keys.append((lowered[pos + 1:], idx))
+            if collector_id:
+                keys.append((collector_id, idx))
+
+            text = f"{lowered}\t{collector_id}"
+            self.search_text.append(text)
+            for tri in {text[i:i + 3] for i in range(len(text) - 2)}:
+                self.trigrams.setdefault(tri, []).append(idx)
+
+        keys.sort()
+        self.prefix_keys = [key for key, _ in keys]
+        self.prefix_entries = [idx for _, idx in keys]
+
+    def search(self, query, limit=30):
+        """
+        Returns up to `limit` names: prefix matches first, then substring
+        matches (queries of three or more characters).
+        """
+        q = query.strip().lower()
+        if not q:
+            return self.names[:limit]
+
+        found = []
+        seen = set()
+
+        i = bisect_left(self.prefix_keys, q)
+        while i < len(self.prefix_keys) and len(found) < limit and self.prefix_keys[i].startswith(q):
+            idx = self.prefix_entries[i]
+            if idx not in seen:
+                seen.add(idx)
+                found.append(idx)
+            i += 1
+
+        if len(found) < limit and len(q) >= 3:
+            postings = [self.trigrams.get(q[j:j + 3]) for j in range(len(q) - 2)]
+            if all(postings):
+                for idx in min(postings, key=len):
+                    if idx not in seen and q in self.search_text[idx]:
+                        seen.add(idx)
+                        found.append(idx)
+                        if len(found) >= limit: break
+
+        return [self.names[idx] for idx in found]
+
+# --- Cached Directory ---
+
+class CollectorDirectory(WatchedFile):
+    """
+    Cached view of the collectors workbook (see WatchedFile); changes are
+    reported through `on_change(collectors)`.
+    `index` is a CollectorIndex for type-ahead search over the current list.
+    """
+    watcher_name = "Collector"
+
+    def __init__(self, file_name, sheet_name="Collectors"):
+        super().__init__(file_name)
+        self.sheet_name = sheet_name
+        self.collectors = {}
+        self.index = CollectorIndex({})
+        self.refresh()
+
+    def get(self):
+        return self.collectors
+
+    def refresh(self, force=False):
+        """
+        Reloads the workbook if it changed (or if `force`). Returns True
+        when the collector list was reloaded.
+        """
+        with self.lock:
+            signature = self._file_signature()
+            if signature is not None and signature == self.signature and not force:
+                return False
+
+            collectors = manage_collectors_db("read", self.file_name, self.sheet_name)
+            if "Error" in collectors and self.collectors:
+                # Keep the last good list (e.g. file is half-written by Excel)
+                return False
+            self.index = CollectorIndex(collectors)
+            self.collectors = collectors
+            # Taken before the read: a save that finishes during it is picked up next time
+            self.signature = signature
+            return True
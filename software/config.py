@@ -0,0 +1,70 @@
+# --- Configuration Constants ---
+EXCEL_LOG_FILE = "Recycling_Logs.xlsx"
+LOG_SHARDING = "none"         # "none": one log file; "month"/"year": one file per period (Recycling_Logs_2026-10.xlsx)
+COLLECTORS_DB_FILE = "Collectors_Database.xlsx"
+JOURNAL_FILE = "Recycling_Journal.db"
+REPORT_FILE = "Recycling_Report.xlsx"
+CATALOG_FILE = "catalog.json"  # Materials and packaging (see catalog.py); the tables below are used without it
+CATALOG_SITE = ""             # Site whose custom tares apply ("site_tares" in the catalog)
+CATALOG_WATCH_INTERVAL_S = 5.0  # How often the catalog file is checked for changes
+BAUD_RATE = 115200
+EXTRA_PORTS = []              # Listed with the serial ports, e.g. ["socket://127.0.0.1:7777"] for scale_simulator.py
+LOGO_PATH = "assets/logo.png" 
+LOGO_SIZE = (400, 120)
+REFRESH_ICON_PATH = "assets/refresh_icon.png"
+LOG_FLUSH_EVERY = 10          # Transactions kept in memory before writing the log file
+LOG_FLUSH_INTERVAL_S = 30.0   # Maximum seconds a transaction waits before being written
+COLLECTORS_WATCH_INTERVAL_S = 5.0  # How often the collectors file is checked for changes
+COLLECTOR_MATCH_LIMIT = 30    # Collectors listed in the type-ahead dropdown
+SAVE_QUEUE_SIZE = 100         # Transactions waiting for the background writer
+SAVE_RETRY_DELAY_S = 5.0      # Wait between retries when the log file is locked
+STABILITY_TOLERANCE_KG = 0.05 # Readings within this band count as the same weight
+STABILITY_HOLD_S = 1.5        # Seconds the weight must stay in the band to be stable
+STREAM_TIMEOUT_S = 3.0        # Without streamed readings for this long, stability and auto capture are off
+AUTO_CAPTURE_MODE = "off"     # "off", "prefill" (lock the stable weight) or "register" (also save it)
+AUTO_CAPTURE_MIN_KG = 0.2     # Loads below this are ignored; dropping below it re-arms the capture
+AUTO_CAPTURE_LABELS = {"off": "Off", "prefill": "Pre-fill", "register": "Register"}
+LOG_LAYOUT = "fixed"          # "fixed": one column per known material; "append": add columns as materials appear
+API_ENABLED = False           # Serve live weights and accept transactions over HTTP/WebSocket
+API_HOST = "127.0.0.1"        # Interface the API listens on ("0.0.0.0" for the network; needs API_TOKEN)
+API_PORT = 8765
+API_TOKEN = ""                # Clients must send it (Authorization: Bearer <token> or ?token=); required off this PC
+METRICS_ENABLED = False       # Time the hot paths from startup (can also be switched in the diagnostics window, F12)
+METRICS_LOG_INTERVAL_S = 60.0 # Seconds between metrics summary lines while metrics are on
+METRICS_FILE = ""             # Prometheus text file written with the summary, e.g. "recycling.prom" ("" = off)
+STATION_ID = ""               # Name of this PC in the consolidated store ("" = host name)
+SYNC_DIR = ""                 # Shared folder for station deltas, e.g. r"\\server\recycling" ("" = off)
+SYNC_URL = ""                 # Or a sync server (station_sync.py serve), e.g. "http://10.0.0.5:8780"
+SYNC_TOKEN = ""               # Sent to the sync server as "Authorization: Bearer <token>"
+SYNC_INTERVAL_S = 300.0       # Seconds between pushes of new transactions
+CONSOLIDATED_DB_FILE = "Recycling_Consolidated.db"  # Store merged from all stations
+
+# --- Data Structures ---
+# Built-in catalog, used when CATALOG_FILE does not exist
+MATERIALS_BY_CATEGORY = {
+    "Metals": [
+        "Aluminum", "Scrap Metal", "Copper", "Bronze", 
+        "Antimony", "Steel", "Other Metals"
+    ],
+    "Paper & Cardboard": [
+        "Archive", "Cardboard", "Trays/Panels", "Newspaper", 
+        "Foldable", "Tetra Pack", "Plasticized", "Kraft", 
+        "Other Paper/Cardboard"
+    ],
+    "Plastics": [
+        "Acrylic", "Paste", "PET", "PVC", "White Plastic", 
+        "Polyethylene", "Blown Plastic", "Polypropylene", 
+        "Other Plastics"
+    ],
+    "Glass": ["Other Glass"],
+    "Textile": ["Other Textiles"],
+    "Wood": ["Other Wood"]
+}
+
+PACKAGING_WEIGHTS = {
+    "None": 0.0,
+    "Burlap Bag": 1.5,
+    "Balloon": 2.5,
+    "Tarp": 2.0
+}
+
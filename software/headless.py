@@ -0,0 +1,171 @@
+import argparse
+import signal
+import threading
+from config import (EXCEL_LOG_FILE, LOG_SHARDING, JOURNAL_FILE, BAUD_RATE, LOG_FLUSH_EVERY, LOG_FLUSH_INTERVAL_S,
+    SAVE_QUEUE_SIZE, SAVE_RETRY_DELAY_S, CATALOG_WATCH_INTERVAL_S, METRICS_ENABLED, METRICS_LOG_INTERVAL_S, METRICS_FILE)
+from catalog import CATALOG
+from log_shards import import_log_history, open_log_writer
+from journal import TransactionJournal, note_live_weighings
+from serial_protocol import ProtocolParser
+from serial_reader import read_serial_data
+from metrics import METRICS, MetricsReporter
+from station_sync import start_sync_agent
+from save_pipeline import SaveWorker, STATUS_FAILED, STATUS_RETRYING
+
+# --- Headless Logger ---
+# Logs every weighing sent by the scale (button 3 on the controller) without
+# the GUI. customtkinter and Tk are never imported, so this runs on boards
+# without a display, e.g. as a systemd service (see the README).
+# systemd stops the service with SIGTERM; pending changes are written first.
+# SIGUSR1 switches the timing metrics on or off.
+
+class ScaleLogger:
+    """
+    Receives readings from one serial port. A reading that carries a date is
+    a logged weighing and becomes a transaction with the given defaults.
+    """
+    def __init__(self, port, service, defaults):
+        self.port = port
+        self.service = service
+        self.defaults = defaults
+        self.parser = ProtocolParser()
+
+    @property
+    def running(self):
+        return self.service.running
+
+    def process_reading(self, date_str, gross_weight, weighings=()):
+        # Every logged weighing of the burst is saved with its own weight;
+        # streamed readings (weight only) are not weighings
+        note_live_weighings(self.service.journal, self.port, weighings)
+        for weighing in weighings:
+            data = dict(self.defaults)
+            data.update({
+                "date": weighing.date,
+                "gross_weight": weighing.weight,
+                "net_weight": round(weighing.weight - data["tare"], 2),
+                "scale": self.port,
+            })
+            self.service.submit_transaction(data)
+
+    def report_serial_error(self, port):
+        print(f"Lost connection to {port}.")
+        self.service.port_closed(self)
+
+class HeadlessService:
+    """
+    Shares the journal, the Excel log and the background writer between the
+    scale loggers, like the GUI does.
+    """
+    def __init__(self, ports, defaults, log_file=EXCEL_LOG_FILE, journal_file=JOURNAL_FILE, baud_rate=BAUD_RATE):
+        self.running = True
+        self.baud_rate = baud_rate
+        self.stopped = threading.Event()
+        self.journal = TransactionJournal(journal_file)
+        import_log_history(self.journal, log_file)
+        self.log_writer = open_log_writer(log_file, LOG_SHARDING, LOG_FLUSH_EVERY, LOG_FLUSH_INTERVAL_S, CATALOG.get().log_schedule)
+        self.defaults = defaults
+        self.save_worker = SaveWorker(
+            self.journal, self.log_writer, self.report_save_status,
+            max_queue=SAVE_QUEUE_SIZE, retry_delay=SAVE_RETRY_DELAY_S
+        )
+        self.loggers = [ScaleLogger(port, self, defaults) for port in ports]
+        self.open_loggers = set(self.loggers)
+
+    def run(self):
+        self.save_worker.start()
+        CATALOG.start_watching(CATALOG_WATCH_INTERVAL_S, self.catalog_changed)
+        sync_agent = start_sync_agent(self.journal)
+        for scale in self.loggers:
+            threading.Thread(target=read_serial_data, args=(scale.port, self.baud_rate, scale, scale.parser), daemon=True).start()
+        # Wake up regularly so signals are handled promptly
+        while not self.stopped.wait(1.0):
+            pass
+        self.running = False
+        if sync_agent: sync_agent.stop()
+        self.save_worker.stop(10)
+        self.journal.close()
+
+    def stop(self, *_):
+        self.stopped.set()
+
+    def submit_transaction(self, data):
+        try:
+            ticket = self.save_worker.submit(data)
+        except Exception as e:
+            print(f"Transaction from {data['scale']} dropped: {e}")
+            return
+        print(f"#{ticket} {data['scale']}: {data['date']} {data['net_weight']:.2f} kg {data['material']}")
+
+    def report_save_status(self, ticket, status, message):
+        # Only problems are printed; successful saves would flood the service log
+        if status in (STATUS_FAILED, STATUS_RETRYING):
+            print(f"Save {status}{'' if ticket is None else f' (#{ticket})'}: {message}")
+
+    def catalog_changed(self, catalog):
+        # Shared with the loggers, so updating it in place is enough
+        try:
+            self.defaults.update(transaction_defaults(
+                self.defaults["material"], self.defaults["collector"], self.defaults["collector_id"], self.defaults["packaging"]
+            ))
+        except KeyError as e:
+            print(f"Catalog Warning: {e} is no longer in the catalog; keeping the previous defaults.")
+        self.log_writer.material_schedule = catalog.log_schedule
+
+    def port_closed(self, scale):
+        self.open_loggers.discard(scale)
+        if not self.open_loggers:
+            print("No scale connected. Stopping.")
+            self.stop()
+
+def transaction_defaults(material, collector="UNASSIGNED", collector_id="N/A", packaging="None"):
+    """
+    Fields recorded for every weighing when nobody picks them in the GUI.
+    `material` is the name used in the log ("PET"); raises KeyError if it
+    or `packaging` is not in the catalog.
+    """
+    catalog = CATALOG.get()
+    return {
+        "packaging": packaging,
+        "tare": catalog.tares[packaging],
+        "category": catalog.material_categories[material],
+        "material": material,
+        "collector": collector.upper(),
+        "collector_id": collector_id,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Log scale weighings without the GUI.")
+    parser.add_argument("--port", action="append", required=True, help="Serial port of a scale (repeat for several scales)")
+    parser.add_argument("--baud", type=int, default=BAUD_RATE)
+    parser.add_argument("--material", required=True, help="Material recorded for every weighing")
+    parser.add_argument("--collector", default="UNASSIGNED")
+    parser.add_argument("--collector-id", default="N/A")
+    parser.add_argument("--packaging", default="None", choices=list(CATALOG.get().tares))
+    parser.add_argument("--log-file", default=EXCEL_LOG_FILE)
+    parser.add_argument("--journal", default=JOURNAL_FILE)
+    parser.add_argument("--metrics", action="store_true", default=METRICS_ENABLED, help="Log timing metrics periodically")
+    parser.add_argument("--metrics-file", default=METRICS_FILE, help="Also write them to this Prometheus text file")
+    parser.add_argument("--metrics-interval", type=float, default=METRICS_LOG_INTERVAL_S)
+    args = parser.parse_args(argv)
+
+    args.material = args.material.upper()
+    if args.material not in CATALOG.get().material_categories:
+        parser.error(f"unknown material '{args.material}'")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    defaults = transaction_defaults(args.material, args.collector, args.collector_id, args.packaging)
+    service = HeadlessService(args.port, defaults, args.log_file, args.journal, args.baud)
+    if args.metrics: METRICS.enable()
+    MetricsReporter(METRICS, args.metrics_interval, args.metrics_file or None).start()
+    if hasattr(signal, "SIGUSR1"):
+        # kill -USR1 <pid> switches the metrics on or off while running
+        signal.signal(signal.SIGUSR1, lambda *_: METRICS.disable() if METRICS.enabled else METRICS.enable())
+    signal.signal(signal.SIGTERM, service.stop)
+    signal.signal(signal.SIGINT, service.stop)
+    service.run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import sqlite3
+import threading
+from datetime import datetime
+import openpyxl
+from log_writer import LOG_HEADERS, build_log_headers, save_workbook_atomic, sheet_title_for_date
+
+# --- Schema ---
+TRANSACTION_FIELDS = [
+    "date", "collector", "collector_id", "category", "material",
+    "packaging", "gross_weight", "tare", "net_weight", "scale"
+]
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS transactions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    recorded_at TEXT NOT NULL,
+    date TEXT NOT NULL,
+    collector TEXT NOT NULL,
+    collector_id TEXT,
+    category TEXT,
+    material TEXT NOT NULL,
+    packaging TEXT,
+    gross_weight REAL,
+    tare REAL,
+    net_weight REAL NOT NULL,
+    scale TEXT
+)
+"""
+
+# Records taken from a scale's buffer (bulk_ingest.py), so each is stored once
+CREATE_INGESTED_SQL = """
+CREATE TABLE IF NOT EXISTS ingested_records (
+    scale TEXT NOT NULL,
+    stamp TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (scale, stamp)
+)
+"""
+
+# Last sequence number exported to each sync target (station_sync.py)
+CREATE_SYNC_MARKS_SQL = """
+CREATE TABLE IF NOT EXISTS sync_marks (
+    target TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+)
+"""
+
+# Highest firmware sequence number received live from each scale, so
+# bulk_ingest.py skips buffered records the application already saw
+CREATE_LIVE_MARKS_SQL = """
+CREATE TABLE IF NOT EXISTS live_marks (
+    scale TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+)
+"""
+
+# --- Journal ---
+
+class TransactionJournal:
+    """
+    Append-only journal of raw transactions stored in SQLite (WAL mode).
+    It is the system of record: every weighing is kept as registered and
+    the monthly Excel sheets are rebuilt from it with export_to_excel().
+    """
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(file_name, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute(CREATE_TABLE_SQL)
+        self.conn.execute(CREATE_INGESTED_SQL)
+        self.conn.execute(CREATE_SYNC_MARKS_SQL)
+        self.conn.execute(CREATE_LIVE_MARKS_SQL)
+
+    def append(self, entry_data):
+        """
+        Stores one transaction and returns its sequence number.
+        """
+        row = [datetime.now().isoformat(timespec="seconds")]
+        row += [entry_data.get(field) for field in TRANSACTION_FIELDS]
+        with self.lock:
+            cur = self.conn.execute(
+                f"INSERT INTO transactions (recorded_at, {', '.join(TRANSACTION_FIELDS)}) "
+                f"VALUES ({', '.join('?' * len(row))})", row
+            )
+            return cur.lastrowid
+
+    def append_many(self, entries, recorded_at=None):
+        """
+        Stores several transactions in a single SQLite transaction.
+        """
+        recorded_at = recorded_at or datetime.now().isoformat(timespec="seconds")
+        rows = [[recorded_at] + [entry.get(field) for field in TRANSACTION_FIELDS] for entry in entries]
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    f"INSERT INTO transactions (recorded_at, {', '.join(TRANSACTION_FIELDS)}) "
+                    f"VALUES ({', '.join('?' * (len(TRANSACTION_FIELDS) + 1))})", rows
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def append_new(self, entries, keys, recorded_at=None):
+        """
+        Stores, in a single SQLite transaction, the transactions whose key
+        (scale, stamp) has not been stored before, and returns them.
+        Duplicates within `entries` are stored once. Entries with the key
+        None are always stored.
+        """
+        recorded_at = recorded_at or datetime.now().isoformat(timespec="seconds")
+        insert_sql = (
+            f"INSERT INTO transactions (recorded_at, {', '.join(TRANSACTION_FIELDS)}) "
+            f"VALUES ({', '.join('?' * (len(TRANSACTION_FIELDS) + 1))})"
+        )
+        new_entries = []
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                for entry, key in zip(entries, keys):
+                    if key is not None and \
+                       self.conn.execute("SELECT 1 FROM ingested_records WHERE scale = ? AND stamp = ?", key).fetchone():
+                        continue
+                    cur = self.conn.execute(insert_sql, [recorded_at] + [entry.get(field) for field in TRANSACTION_FIELDS])
+                    if key is not None:
+                        self.conn.execute("INSERT INTO ingested_records (scale, stamp, seq) VALUES (?, ?, ?)", (*key, cur.lastrowid))
+                    new_entries.append(entry)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return new_entries
+
+    def last_seq(self):
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM transactions").fetchone()[0]
+
+    def sync_mark(self, target):
+        """
+        Last sequence number exported to `target` (0 if never).
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT seq FROM sync_marks WHERE target = ?", (target,)).fetchone()
+            return row[0] if row else 0
+
+    def set_sync_mark(self, target, seq):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO sync_marks (target, seq) VALUES (?, ?) ON CONFLICT(target) DO UPDATE SET seq = excluded.seq",
+                (target, seq)
+            )
+
+    def live_mark(self, scale):
+        """
+        Highest firmware sequence number received live from `scale` (0 if none).
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT seq FROM live_marks WHERE scale = ?", (scale,)).fetchone()
+            return row[0] if row else 0
+
+    def set_live_mark(self, scale, seq):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO live_marks (scale, seq) VALUES (?, ?) "
+                "ON CONFLICT(scale) DO UPDATE SET seq = MAX(seq, excluded.seq)",
+                (scale, seq)
+            )
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    def iter_transactions(self, since_seq=0, batch_size=5000):
+        """
+        Yields transactions as dicts in registration order. Uses its own
+        connection so it can run in a background thread while the app keeps
+        appending.
+        """
+        conn = sqlite3.connect(self.file_name)
+        conn.row_factory = sqlite3.Row
+        try:
+            cur = conn.execute("SELECT * FROM transactions WHERE seq > ? ORDER BY seq", (since_seq,))
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows: break
+                for row in rows:
+                    yield dict(row)
+        finally:
+            conn.close()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def note_live_weighings(journal, scale, weighings):
+    """
+    Moves the live mark of `scale` to the highest firmware sequence number
+    among `weighings` (Readings). Called by the serial readers for every
+    logged weighing received, whether or not it is registered.
+    """
+    seqs = [w.seq for w in weighings if w.seq is not None]
+    if not seqs: return
+    try:
+        journal.set_live_mark(scale, max(seqs))
+    except sqlite3.Error as e:
+        print(f"Journal Write Error: {e}")
+
+# --- Excel Import / Export ---
+
+def import_from_excel(journal, file_name):
+    """
+    Seeds an empty journal from an existing log workbook so its history is
+    kept when the file is later rebuilt. The sheets only hold daily totals,
+    so each non-zero material cell becomes one transaction.
+    """
+    wb = openpyxl.load_workbook(file_name, read_only=True)
+    entries = []
+    try:
+        for ws in wb.worksheets:
+            rows = ws.iter_rows(values_only=True)
+            headers = list(next(rows, []))
+            if "DATE" not in headers or "NAME" not in headers: continue
+            date_idx, name_idx = headers.index("DATE"), headers.index("NAME")
+            id_idx = headers.index("ID") if "ID" in headers else None
+            material_cols = [(i, h) for i, h in enumerate(headers) if h and h not in LOG_HEADERS]
+
+            for row in rows:
+                if not row or row[date_idx] is None or row[name_idx] is None: continue
+                for i, material in material_cols:
+                    weight = row[i] if i < len(row) else None
+                    if not weight: continue
+                    entries.append({
+                        "date": str(row[date_idx]),
+                        "collector": str(row[name_idx]),
+                        "collector_id": str(row[id_idx]) if id_idx is not None and row[id_idx] is not None else "N/A",
+                        "material": str(material),
+                        "net_weight": float(weight),
+                        "packaging": "Imported",
+                    })
+    finally:
+        wb.close()
+    return journal.append_many(entries)
+
+def export_to_excel(journal, file_name, material_schedule=None, file_for_sheet=None):
+    """
+    Rebuilds the monthly (Month-Year) sheets from the journal, using the
+    same column layout as ExcelLogWriter. Totals are aggregated in memory
+    first, so each sheet is written in a single pass.
+    `file_for_sheet(sheet_title)` spreads the sheets over several files
+    (see log_shards); by default they all go to `file_name`.
+    Each workbook is saved to a temporary file and then moved into place.
+    """
+    sheets = {}
+    for tx in journal.iter_transactions():
+        sheet = sheets.setdefault(sheet_title_for_date(tx["date"]), {"materials": [], "rows": {}})
+        if tx["material"] not in sheet["materials"]:
+            sheet["materials"].append(tx["material"])
+
+        key = (tx["date"], tx["collector"])
+        row = sheet["rows"].get(key)
+        if row is None:
+            row = sheet["rows"][key] = {"id": tx["collector_id"], "weights": {}}
+        row["weights"][tx["material"]] = row["weights"].get(tx["material"], 0.0) + tx["net_weight"]
+
+    workbooks = {}
+    for sheet_title, sheet in sheets.items():
+        target = file_for_sheet(sheet_title) if file_for_sheet else file_name
+        wb = workbooks.get(target)
+        if wb is None:
+            wb = workbooks[target] = openpyxl.Workbook()
+            wb.remove(wb.active)
+        ws = wb.create_sheet(sheet_title)
+        headers = build_log_headers(material_schedule)
+        headers += [m for m in sheet["materials"] if m not in headers]
+        ws.append(headers)
+        for (date_val, collector), row in sheet["rows"].items():
+            weights = row["weights"]
+            values = [date_val, collector, row["id"]]
+            values += [sum(weights.values()) if h == "TOTAL" else weights.get(h, 0.0) for h in headers[3:]]
+            ws.append(values)
+    if not sheets:
+        sheet_title = sheet_title_for_date(datetime.now().strftime("%d/%m/%Y"))
+        wb = workbooks[file_for_sheet(sheet_title) if file_for_sheet else file_name] = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = sheet_title
+        ws.append(build_log_headers(material_schedule))
+
+    for target, wb in workbooks.items():
+        save_workbook_atomic(wb, target)
+    return len(sheets)
@@ -0,0 +1,276 @@
+import json
+import os
+import threading
+from datetime import datetime
+from log_writer import MONTHS_EN, ExcelLogWriter, PENDING_SUFFIX
+from journal import export_to_excel, import_from_excel
+
+# --- Shard Layout ---
+# With sharding, "Recycling_Logs.xlsx" becomes one file per period, e.g.
+# "Recycling_Logs_2026-10.xlsx" ("month") or "Recycling_Logs_2026.xlsx"
+# ("year"), listed in "Recycling_Logs.manifest.json":
+#
+#   {"sharding": "month", "shards": [{"period": "2026-10", "file": "Recycling_Logs_2026-10.xlsx", "archived": false}, ...]}
+#
+# Only the newest shard is written. Older shards are archives: a
+# transaction dated in an archived period goes to its Month-Year sheet in
+# the current shard, so readers must combine all shards (shard_files()).
+# A log written before sharding was enabled stays as an archived shard
+# until the log is rebuilt from the journal.
+
+SHARDING_MODES = ("none", "month", "year")
+
+def shard_period(date_val, sharding):
+    """
+    "05/10/2026" -> "2026-10" (month) or "2026" (year); None if the date
+    cannot be parsed.
+    """
+    parts = str(date_val).split("/")
+    if len(parts) != 3 or not parts[1].isdigit() or not parts[2].isdigit():
+        return None
+    return parts[2] if sharding == "year" else f"{parts[2]}-{int(parts[1]):02d}"
+
+def shard_period_for_sheet(sheet_title, sharding):
+    """
+    "October-2026" -> "2026-10" (month) or "2026" (year); None otherwise.
+    """
+    month, _, year = sheet_title.partition("-")
+    if month not in MONTHS_EN or not year.isdigit():
+        return None
+    return year if sharding == "year" else f"{year}-{MONTHS_EN.index(month) + 1:02d}"
+
+def manifest_path(file_name):
+    return os.path.splitext(file_name)[0] + ".manifest.json"
+
+def shard_file_name(file_name, period):
+    base, ext = os.path.splitext(file_name)
+    return f"{base}_{period}{ext}"
+
+class ShardManifest:
+    """
+    List of shards next to the base log file. Saved atomically on change.
+    """
+    def __init__(self, file_name, sharding):
+        self.file_name = file_name
+        self.path = manifest_path(file_name)
+        self.directory = os.path.dirname(os.path.abspath(file_name))
+        self.sharding = sharding
+        self.shards = []
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.shards = data.get("shards", [])
+        elif os.path.exists(file_name):
+            # Log from before sharding: kept as a read-only archive
+            self.shards = [{"period": None, "file": os.path.basename(file_name), "archived": True}]
+            self.save()
+
+    def save(self):
+        tmp_name = self.path + ".tmp"
+        with open(tmp_name, "w", encoding="utf-8") as f:
+            json.dump({"sharding": self.sharding, "shards": self.shards}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, self.path)
+
+    def path_of(self, shard):
+        return os.path.join(self.directory, shard["file"])
+
+    def current(self):
+        """
+        The newest shard that is not archived, or None.
+        """
+        active = [s for s in self.shards if not s["archived"] and s["period"] not in (None, "undated")]
+        return max(active, key=lambda s: s["period"]) if active else None
+
+    def add(self, period):
+        """
+        Makes `period` the current shard and archives the others.
+        """
+        for shard in self.shards:
+            shard["archived"] = True
+        shard = {"period": period, "file": os.path.basename(shard_file_name(self.file_name, period)), "archived": False}
+        self.shards.append(shard)
+        self.save()
+        return shard
+
+def import_log_history(journal, file_name):
+    """
+    Seeds an empty journal from the existing log (every shard).
+    """
+    if journal.count() != 0: return
+    for log_file in shard_files(file_name):
+        try:
+            print(f"Importing existing history from '{log_file}'...")
+            import_from_excel(journal, log_file)
+        except Exception as e:
+            print(f"Excel Import Error: {e}")
+
+def shard_files(file_name):
+    """
+    All log files holding history: the shards in the manifest, or just
+    `file_name` when the log is not sharded.
+    """
+    path = manifest_path(file_name)
+    if not os.path.exists(path):
+        return [file_name] if os.path.exists(file_name) else []
+    with open(path, encoding="utf-8") as f:
+        shards = json.load(f).get("shards", [])
+    directory = os.path.dirname(os.path.abspath(file_name))
+    files = [os.path.join(directory, s["file"]) for s in shards]
+    return [f for f in files if os.path.exists(f)]
+
+# --- Sharded Writer ---
+
+class ShardedLogWriter:
+    """
+    Same interface as ExcelLogWriter, writing to the current shard only.
+    A transaction for a newer period starts a new shard: the current one is
+    flushed, closed and archived, so load and save times stay bounded by
+    one period of data.
+    """
+    def __init__(self, file_name, sharding="month", flush_every=10, flush_interval=30.0, material_schedule=None):
+        self.base_file_name = file_name
+        self.sharding = sharding
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._material_schedule = material_schedule
+        self.lock = threading.RLock()
+        self.manifest = ShardManifest(file_name, sharding)
+        self.shard = self.manifest.current()
+        self.writer = self._open(self.shard) if self.shard else None
+
+    @property
+    def file_name(self):
+        return self.manifest.path_of(self.shard) if self.shard else self.base_file_name
+
+    @property
+    def pending(self):
+        return self.writer.pending if self.writer else 0
+
+    @property
+    def material_schedule(self):
+        return self._material_schedule
+
+    @material_schedule.setter
+    def material_schedule(self, schedule):
+        # Layout of new sheets, e.g. after the catalog was reloaded. Set from
+        # the GUI thread without the lock (a save may hold it for seconds);
+        # the writer picks it up on its next append (_writer_for).
+        self._material_schedule = schedule
+
+    def _open(self, shard):
+        return ExcelLogWriter(self.manifest.path_of(shard), self.flush_every, self.flush_interval, self.material_schedule)
+
+    def _starts_shard(self, entry_data):
+        period = shard_period(entry_data["date"], self.sharding)
+        return self.shard is None or (period is not None and period > self.shard["period"])
+
+    def _writer_for(self, entry_data):
+        if self._starts_shard(entry_data):
+            period = shard_period(entry_data["date"], self.sharding)
+            if self.writer is not None:
+                try:
+                    self.writer.close()
+                except Exception as e:
+                    # Old shard locked (e.g. open in Excel): keep writing to it and rotate later
+                    print(f"Log rotation postponed: {e}")
+                    self.writer.material_schedule = self._material_schedule
+                    return self.writer
+            self.shard = self.manifest.add(period or shard_period(datetime.now().strftime("%d/%m/%Y"), self.sharding))
+            self.writer = self._open(self.shard)
+        self.writer.material_schedule = self._material_schedule
+        return self.writer
+
+    def recover(self):
+        """
+        Replays pending queues: archived shards (interrupted while being
+        closed) are written at once; the count for the current shard is
+        returned as for ExcelLogWriter.recover().
+        """
+        with self.lock:
+            for shard in self.manifest.shards:
+                path = self.manifest.path_of(shard)
+                if shard is self.shard or not os.path.exists(path + PENDING_SUFFIX): continue
+                if os.path.getsize(path + PENDING_SUFFIX) == 0: continue
+                archived = ExcelLogWriter(path, material_schedule=self.material_schedule)
+                print(f"Replaying {archived.recover()} pending transaction(s) into archived '{shard['file']}'.")
+                archived.close()
+            return self.writer.recover() if self.writer else 0
+
+    def append(self, entry_data):
+        with self.lock:
+            self._writer_for(entry_data).append(entry_data)
+
+    def append_many(self, entries):
+        """
+        Appends a batch, split where an entry starts a new shard.
+        """
+        with self.lock:
+            batch = []
+            for entry_data in entries:
+                if batch and self._starts_shard(entry_data):
+                    self.writer.append_many(batch)
+                    batch = []
+                if not batch: self._writer_for(entry_data)
+                batch.append(entry_data)
+            if batch: self.writer.append_many(batch)
+
+    def flush_if_due(self):
+        with self.lock:
+            return self.writer.flush_if_due() if self.writer else False
+
+    def flush(self):
+        with self.lock:
+            return self.writer.flush() if self.writer else False
+
+    def discard(self):
+        with self.lock:
+            if self.writer: self.writer.discard()
+            # A rebuild may have rewritten the manifest
+            self.manifest = ShardManifest(self.base_file_name, self.sharding)
+            self.shard = self.manifest.current()
+            self.writer = self._open(self.shard) if self.shard else None
+
+    def close(self):
+        with self.lock:
+            if self.writer: self.writer.close()
+
+def open_log_writer(file_name, sharding="none", flush_every=10, flush_interval=30.0, material_schedule=None):
+    """
+    ExcelLogWriter for a single log file, ShardedLogWriter otherwise.
+    """
+    if sharding not in SHARDING_MODES:
+        raise ValueError(f"Unknown log sharding '{sharding}'; use one of {', '.join(SHARDING_MODES)}.")
+    if sharding == "none":
+        return ExcelLogWriter(file_name, flush_every, flush_interval, material_schedule)
+    return ShardedLogWriter(file_name, sharding, flush_every, flush_interval, material_schedule)
+
+def export_log(journal, log_writer, material_schedule=None):
+    """
+    Rebuilds the log from the journal. For a sharded log every sheet goes
+    to the shard of its period and the manifest is rewritten; the newest
+    shard becomes current. Call log_writer.discard() afterwards.
+    """
+    if not isinstance(log_writer, ShardedLogWriter):
+        return export_to_excel(journal, log_writer.file_name, material_schedule)
+
+    base, sharding = log_writer.base_file_name, log_writer.sharding
+    periods = set()
+
+    def file_for_sheet(sheet_title):
+        period = shard_period_for_sheet(sheet_title, sharding) or "undated"
+        periods.add(period)
+        return shard_file_name(base, period)
+
+    count = export_to_excel(journal, None, material_schedule, file_for_sheet)
+    # The journal holds the whole history, so shards not rebuilt (e.g. a
+    # pre-sharding log) leave the manifest; their files are left on disk.
+    manifest = log_writer.manifest
+    newest = max((p for p in periods if p != "undated"), default=None)
+    manifest.shards = [
+        {"period": p, "file": os.path.basename(shard_file_name(base, p)), "archived": p != newest}
+        for p in sorted(periods)
+    ]
+    manifest.save()
+    return count
@@ -0,0 +1,423 @@
+import json
+import os
+import time
+import threading
+import openpyxl
+from openpyxl.packaging.custom import IntProperty
+from metrics import METRICS
+
+# --- Log Layout ---
+MONTHS_EN = [
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December"
+]
+
+# Standard Headers
+LOG_HEADERS = ["DATE", "NAME", "ID", "TOTAL"]
+
+def build_log_headers(material_schedule=None):
+    """
+    Header row for a new sheet. With a material schedule every material gets
+    a fixed column before TOTAL; without one, materials are appended after
+    TOTAL as they appear. Existing columns are never shifted.
+    """
+    return LOG_HEADERS[:3] + list(material_schedule or []) + LOG_HEADERS[3:]
+
+# --- Sheet Helpers ---
+
+def sheet_title_for_date(date_val):
+    """
+    Returns the monthly sheet name (Month-Year) for a dd/mm/yyyy date.
+    """
+    try:
+        parts = date_val.split('/')
+        if len(parts) == 3:
+            day, month_num, year = parts
+            return f"{MONTHS_EN[int(month_num) - 1]}-{year}"
+        raise ValueError("Invalid date format")
+    except Exception as e:
+        print(f"Date parse warning: {e}. Using 'General_Logs'.")
+        return "General_Logs"
+
+def get_log_sheet(wb, sheet_title, material_schedule=None):
+    """
+    Returns the sheet for a period, creating it with the standard headers.
+    """
+    if sheet_title in wb.sheetnames:
+        ws = wb[sheet_title]
+    elif wb.sheetnames == ["Sheet"] and wb.active.cell(row=1, column=1).value is None:
+        # Fresh workbook: reuse the default empty sheet
+        ws = wb.active
+        ws.title = sheet_title
+    else:
+        ws = wb.create_sheet(sheet_title)
+
+    # Initialize Headers if new sheet
+    if ws.cell(row=1, column=1).value is None:
+        for idx, header in enumerate(build_log_headers(material_schedule)):
+            ws.cell(row=1, column=idx + 1).value = header
+    return ws
+
+class SheetIndex:
+    """
+    Maps header names to columns and (date, collector) to rows for one
+    sheet. Built with a single pass over the sheet and kept up to date by
+    apply_transaction(), so lookups do not depend on the sheet size.
+    """
+    def __init__(self, ws):
+        self.columns = {}
+        self.rows = {}
+
+        header_row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
+        for idx, header in enumerate(header_row):
+            if header is not None and header not in self.columns:
+                self.columns[header] = idx + 1
+
+        date_idx = self.columns.get("DATE")
+        name_idx = self.columns.get("NAME")
+        if date_idx and name_idx:
+            for r, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+                if len(row) < max(date_idx, name_idx): continue
+                self.rows.setdefault((row[date_idx - 1], row[name_idx - 1]), r)
+        self.next_row = ws.max_row + 1
+
+    def column_count(self):
+        return max(self.columns.values(), default=0)
+
+def apply_transaction(ws, entry_data, index=None):
+    """
+    Adds one transaction to a monthly sheet. Each collector gets one row
+    per date and weights are accumulated per material column.
+    Pass the sheet's SheetIndex to avoid scanning the sheet.
+    """
+    date_val = entry_data["date"]
+    collector = entry_data["collector"]
+    collector_id = entry_data["collector_id"]
+    material = entry_data["material"]
+    net_weight = float(entry_data["net_weight"])
+
+    if index is None:
+        index = SheetIndex(ws)
+
+    # Helper to find or create column. New columns are always appended at
+    # the end, so existing cells never move.
+    def get_col_idx(col_name):
+        col = index.columns.get(col_name)
+        if col is None:
+            t0 = METRICS.start()
+            col = index.column_count() + 1
+            ws.cell(row=1, column=col).value = col_name
+            index.columns[col_name] = col
+            METRICS.stop("column_insert", t0)
+        return col
+
+    date_idx = get_col_idx("DATE")
+    name_idx = get_col_idx("NAME")
+    id_idx = get_col_idx("ID")
+    mat_idx = get_col_idx(material)
+    total_idx = get_col_idx("TOTAL")
+
+    # Check if row exists for this collector on this date
+    t0 = METRICS.start()
+    target_row = index.rows.get((date_val, collector))
+
+    # Create new row if not found
+    if target_row is None:
+        target_row = index.next_row
+        index.next_row += 1
+        index.rows[(date_val, collector)] = target_row
+        ws.cell(row=target_row, column=date_idx).value = date_val
+        ws.cell(row=target_row, column=name_idx).value = collector
+        ws.cell(row=target_row, column=id_idx).value = collector_id
+
+        # Initialize other numeric columns to 0
+        for c in range(1, index.column_count() + 1):
+            if c not in [date_idx, name_idx, id_idx]:
+                if ws.cell(row=target_row, column=c).value is None:
+                    ws.cell(row=target_row, column=c).value = 0.0
+    METRICS.stop("row_lookup", t0)
+
+    # Update values
+    current_mat_val = float(ws.cell(row=target_row, column=mat_idx).value or 0.0)
+    ws.cell(row=target_row, column=mat_idx).value = current_mat_val + net_weight
+
+    current_total_val = float(ws.cell(row=target_row, column=total_idx).value or 0.0)
+    ws.cell(row=target_row, column=total_idx).value = current_total_val + net_weight
+
+# --- Crash-safe Saving ---
+
+PENDING_SUFFIX = ".pending"
+APPLIED_SEQ_PROPERTY = "PendingQueueSeq"  # Custom document property: last queue record in the workbook
+
+def fsync_directory(path):
+    """
+    Makes a rename in the directory of `path` durable (no-op on Windows).
+    """
+    if os.name == "nt": return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def save_workbook_atomic(wb, file_name):
+    """
+    Saves to a temporary file, flushes it to disk and renames it over
+    `file_name`. A crash leaves either the old or the new file, never a
+    truncated one.
+    """
+    tmp_name = file_name + ".tmp"
+    try:
+        with open(tmp_name, "wb") as f:
+            wb.save(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, file_name)
+    except Exception:
+        try:
+            os.remove(tmp_name)
+        except OSError:
+            pass
+        raise
+    fsync_directory(file_name)
+
+class PendingQueue:
+    """
+    Append-only file of transactions not yet saved in the workbook, one
+    JSON line per record ({"seq": n, "entry": {...}}). Each record is
+    fsynced before it is applied, so a crash or a failed save does not lose
+    it. The file is emptied once the workbook has been saved.
+    """
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.file = None
+        self.last_seq = 0
+
+    def read(self):
+        """
+        Returns the records in the file. A torn last line (power cut during
+        the write) is skipped.
+        """
+        records = []
+        try:
+            f = open(self.file_name, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return records
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    records.append((int(record["seq"]), record["entry"]))
+                except (ValueError, KeyError, TypeError):
+                    print(f"Skipping damaged record in '{self.file_name}'.")
+        if records:
+            self.last_seq = max(self.last_seq, max(seq for seq, _ in records))
+        return records
+
+    def _open(self):
+        if self.file is None:
+            self.file = open(self.file_name, "a+", encoding="utf-8")
+            # Start on a new line if the last record was torn
+            if self.file.tell() > 0:
+                self.file.seek(self.file.tell() - 1)
+                if self.file.read(1) != "\n": self.file.write("\n")
+        return self.file
+
+    def append(self, entry_data):
+        """
+        Writes one record to disk and returns its sequence number.
+        """
+        f = self._open()
+        self.last_seq += 1
+        f.write(json.dumps({"seq": self.last_seq, "entry": entry_data}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+        return self.last_seq
+
+    def append_many(self, entries):
+        """
+        Writes several records with a single fsync and returns the sequence
+        number of the last one.
+        """
+        f = self._open()
+        lines = []
+        for entry_data in entries:
+            self.last_seq += 1
+            lines.append(json.dumps({"seq": self.last_seq, "entry": entry_data}) + "\n")
+        f.write("".join(lines))
+        f.flush()
+        os.fsync(f.fileno())
+        return self.last_seq
+
+    def clear(self):
+        if self.file is None and not os.path.exists(self.file_name): return
+        f = self._open()
+        f.truncate(0)
+        f.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+# --- Persistent Writer ---
+
+class ExcelLogWriter:
+    """
+    Keeps the log workbook open in memory and applies transactions
+    incrementally. The file is written every `flush_every` transactions
+    or `flush_interval` seconds, and always on close().
+    New sheets are laid out with `material_schedule` (see build_log_headers).
+
+    Each transaction is first appended to a PendingQueue next to the log
+    (`<file>.pending`); saves are atomic. The workbook records the last
+    queue sequence it contains, so records left by a crash or a failed save
+    are replayed exactly once when the workbook is next loaded (recover()).
+    """
+    def __init__(self, file_name, flush_every=10, flush_interval=30.0, material_schedule=None):
+        self.file_name = file_name
+        self.material_schedule = material_schedule
+        self.flush_every = max(1, int(flush_every))
+        self.flush_interval = float(flush_interval)
+
+        self.lock = threading.RLock()
+        self.wb = None
+        self.indexes = {}
+        self.pending = 0
+        self.applied_seq = 0
+        self.queue = PendingQueue(file_name + PENDING_SUFFIX)
+        self.last_flush = time.monotonic()
+        self.saved_mtime = None
+
+    def _file_mtime(self):
+        try:
+            return os.path.getmtime(self.file_name)
+        except OSError:
+            return None
+
+    def _ensure_loaded(self):
+        # Pick up edits made outside the app, as long as nothing is pending
+        if self.wb is not None and self.pending == 0 and self._file_mtime() != self.saved_mtime:
+            self.wb = None
+
+        if self.wb is None:
+            self.indexes = {}
+            t0 = METRICS.start()
+            if os.path.exists(self.file_name):
+                self.wb = openpyxl.load_workbook(self.file_name)
+            else:
+                self.wb = openpyxl.Workbook()
+            METRICS.stop("excel_load", t0)
+            self.saved_mtime = self._file_mtime()
+
+            props = self.wb.custom_doc_props
+            self.applied_seq = int(props[APPLIED_SEQ_PROPERTY].value or 0) if APPLIED_SEQ_PROPERTY in props.names else 0
+            self.queue.last_seq = max(self.queue.last_seq, self.applied_seq)
+            self._replay_pending()
+        return self.wb
+
+    def _replay_pending(self):
+        for seq, entry_data in self.queue.read():
+            if seq <= self.applied_seq: continue  # Already in the saved workbook
+            try:
+                self._apply(entry_data)
+            except Exception as e:
+                print(f"Pending transaction {seq} could not be replayed: {e}")
+            self.applied_seq = seq
+            self.pending += 1
+
+    def _apply(self, entry_data):
+        sheet_title = sheet_title_for_date(entry_data["date"])
+        ws = get_log_sheet(self.wb, sheet_title, self.material_schedule)
+        index = self.indexes.get(sheet_title)
+        if index is None:
+            index = self.indexes[sheet_title] = SheetIndex(ws)
+        apply_transaction(ws, entry_data, index)
+
+    def recover(self):
+        """
+        Loads the workbook and replays the pending queue. Returns the number
+        of transactions waiting to be written; call flush() afterwards.
+        """
+        with self.lock:
+            self._ensure_loaded()
+            return self.pending
+
+    def append(self, entry_data):
+        """
+        Queues a transaction on disk and applies it in memory. Call
+        flush_if_due() afterwards; if a flush fails the transaction stays
+        pending (also in the queue file) for the next one.
+        """
+        with self.lock:
+            self._ensure_loaded()
+            seq = self.queue.append(entry_data)
+            self._apply(entry_data)
+            self.applied_seq = seq
+            self.pending += 1
+
+    def append_many(self, entries):
+        """
+        Like append() for a batch: the entries are queued with one disk
+        write and applied in memory. Call flush() once afterwards.
+        """
+        if not entries: return
+        with self.lock:
+            self._ensure_loaded()
+            seq = self.queue.append_many(entries)
+            for entry_data in entries:
+                self._apply(entry_data)
+            self.applied_seq = seq
+            self.pending += len(entries)
+
+    def flush_if_due(self):
+        """
+        Flushes when the batch size or the interval has been reached.
+        """
+        with self.lock:
+            if self.pending == 0:
+                return False
+            if self.pending >= self.flush_every or \
+               time.monotonic() - self.last_flush >= self.flush_interval:
+                return self.flush()
+            return False
+
+    def flush(self):
+        """
+        Writes pending changes to disk. Returns True if the file was written.
+        """
+        with self.lock:
+            if self.wb is None or self.pending == 0:
+                return False
+            props = self.wb.custom_doc_props
+            if APPLIED_SEQ_PROPERTY in props.names:
+                props[APPLIED_SEQ_PROPERTY].value = self.applied_seq
+            else:
+                props.append(IntProperty(name=APPLIED_SEQ_PROPERTY, value=self.applied_seq))
+
+            t0 = METRICS.start()
+            save_workbook_atomic(self.wb, self.file_name)
+            METRICS.stop("excel_save", t0)
+            self.queue.clear()
+            self.pending = 0
+            self.last_flush = time.monotonic()
+            self.saved_mtime = self._file_mtime()
+            return True
+
+    def discard(self):
+        """
+        Drops the in-memory workbook and any pending changes, e.g. after the
+        file was rebuilt from the journal (which holds every queued entry).
+        """
+        with self.lock:
+            self.wb = None
+            self.indexes = {}
+            self.pending = 0
+            self.queue.clear()
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.wb = None
+            self.indexes = {}
+            self.queue.close()
@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# --- Timing Histograms ---
+# Hot paths call:
+#
+#   t0 = METRICS.start()
+#   ...
+#   METRICS.stop("excel_save", t0)
+#
+# While metrics are off, start() returns None and stop() returns at once,
+# so the instrumentation costs two calls and no clock reads.
+
+# Upper bounds (seconds): 10 us to 30 s, about three per decade
+BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+METRIC_HELP = {
+    "serial_read": "Reading a burst of bytes from the serial port",
+    "serial_parse": "Parsing and coalescing the lines of a burst",
+    "ui_dispatch": "From a reading arriving to the weight labels being updated",
+    "journal_write": "Writing a transaction to the journal",
+    "excel_load": "Loading the log workbook",
+    "row_lookup": "Finding or creating the row of a transaction",
+    "column_insert": "Adding a missing material column",
+    "excel_save": "Saving the log workbook",
+}
+
+class Histogram:
+    """
+    Fixed-bucket histogram. observe() is a bisect and a few additions.
+    """
+    def __init__(self, name, buckets=BUCKETS):
+        self.name = name
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot: above the largest bucket
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max: self.max = value
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.count, self.total, self.max
+
+    def quantile(self, q, counts=None, count=None):
+        """
+        Upper bound of the bucket holding the q-quantile.
+        """
+        if counts is None:
+            counts, count, _, _ = self.snapshot()
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+class Metrics:
+    """
+    Registry of timing histograms. Switch it with enable()/disable() at
+    any time; histograms are created on first use.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def start(self):
+        return time.perf_counter() if self.enabled else None
+
+    def stop(self, name, started):
+        if started is None: return
+        self.observe(name, time.perf_counter() - started)
+
+    def observe(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram(name))
+        histogram.observe(seconds)
+
+    def reset(self):
+        for histogram in list(self.histograms.values()):
+            with histogram.lock:
+                histogram.reset()
+
+    def summary(self):
+        """
+        Returns [(name, count, p50, p95, max)] in seconds, sorted by name.
+        """
+        rows = []
+        for name, histogram in sorted(self.histograms.items()):
+            counts, count, _, maximum = histogram.snapshot()
+            # Bucket bounds can exceed the largest sample
+            p50 = min(histogram.quantile(0.5, counts, count), maximum)
+            p95 = min(histogram.quantile(0.95, counts, count), maximum)
+            rows.append((name, count, p50, p95, maximum))
+        return rows
+
+    def summary_line(self):
+        parts = [
+            f"{name} n={count} p50<={p50 * 1000:.2f}ms p95<={p95 * 1000:.2f}ms max={maximum * 1000:.2f}ms"
+            for name, count, p50, p95, maximum in self.summary() if count
+        ]
+        return "; ".join(parts) if parts else "no samples"
+
+    def render_prometheus(self, prefix="recycling"):
+        """
+        Prometheus text exposition format, one histogram per metric.
+        """
+        lines = []
+        for name, histogram in sorted(self.histograms.items()):
+            metric = f"{prefix}_{name}_seconds"
+            counts, count, total, _ = histogram.snapshot()
+            lines.append(f"# HELP {metric} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, n in zip(histogram.buckets, counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{le="{bound:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {count}')
+            lines.append(f"{metric}_sum {total:.9f}")
+            lines.append(f"{metric}_count {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, file_name):
+        """
+        Writes the exposition text for node_exporter's textfile collector.
+        The file is replaced atomically so scrapes never see half of it.
+        """
+        tmp_name = file_name + ".tmp"
+        with open(tmp_name, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_name, file_name)
+
+# Shared by all modules
+METRICS = Metrics()
+
+class MetricsReporter:
+    """
+    Prints a summary line and optionally writes the Prometheus file every
+    `interval` seconds while metrics are enabled.
+    """
+    def __init__(self, metrics, interval=60.0, file_name=None):
+        self.metrics = metrics
+        self.interval = interval
+        self.file_name = file_name
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            if not self.metrics.enabled: continue
+            print(f"Metrics: {self.metrics.summary_line()}")
+            if self.file_name:
+                try:
+                    self.metrics.write_prometheus(self.file_name)
+                except Exception as e:
+                    print(f"Metrics File Error: {e}")
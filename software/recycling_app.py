@@ -1,191 +1,50 @@
 import serial
 import serial.tools.list_ports
-import time
-import re
 import openpyxl
 import os
 import customtkinter as ctk
+import tkinter as tk
 from tkinter import messagebox
 import threading
+import queue
+import time
+from datetime import datetime
 from PIL import Image, ImageDraw
 import webbrowser
-
-# --- Configuration Constants ---
-EXCEL_LOG_FILE = "Recycling_Logs.xlsx"
-COLLECTORS_DB_FILE = "Collectors_Database.xlsx"
-BAUD_RATE = 115200
-LOGO_PATH = "assets/logo.png" 
-LOGO_SIZE = (400, 120)
-REFRESH_ICON_PATH = "assets/refresh_icon.png"
-
-# --- Data Structures ---
-MATERIALS_BY_CATEGORY = {
-    "Metals": [
-        "Aluminum", "Scrap Metal", "Copper", "Bronze", 
-        "Antimony", "Steel", "Other Metals"
-    ],
-    "Paper & Cardboard": [
-        "Archive", "Cardboard", "Trays/Panels", "Newspaper", 
-        "Foldable", "Tetra Pack", "Plasticized", "Kraft", 
-        "Other Paper/Cardboard"
-    ],
-    "Plastics": [
-        "Acrylic", "Paste", "PET", "PVC", "White Plastic", 
-        "Polyethylene", "Blown Plastic", "Polypropylene", 
-        "Other Plastics"
-    ],
-    "Glass": ["Other Glass"],
-    "Textile": ["Other Textiles"],
-    "Wood": ["Other Wood"]
-}
-
-PACKAGING_WEIGHTS = {
-    "None": 0.0,
-    "Burlap Bag": 1.5,
-    "Balloon": 2.5,
-    "Tarp": 2.0
-}
+from config import (EXCEL_LOG_FILE, COLLECTORS_DB_FILE, JOURNAL_FILE, REPORT_FILE,
+    LOG_SHARDING, BAUD_RATE, EXTRA_PORTS, LOGO_PATH, LOGO_SIZE, REFRESH_ICON_PATH, LOG_FLUSH_EVERY,
+    LOG_FLUSH_INTERVAL_S, COLLECTORS_WATCH_INTERVAL_S, COLLECTOR_MATCH_LIMIT,
+    SAVE_QUEUE_SIZE, SAVE_RETRY_DELAY_S, STABILITY_TOLERANCE_KG, STABILITY_HOLD_S, STREAM_TIMEOUT_S,
+    AUTO_CAPTURE_MODE, AUTO_CAPTURE_MIN_KG, AUTO_CAPTURE_LABELS, CATALOG_WATCH_INTERVAL_S, API_ENABLED, API_HOST,
+    API_PORT, API_TOKEN, METRICS_ENABLED, METRICS_LOG_INTERVAL_S, METRICS_FILE)
+from catalog import CATALOG
+from collectors import CollectorDirectory, create_collectors_db
+from log_writer import apply_transaction, get_log_sheet, save_workbook_atomic, sheet_title_for_date
+from journal import TransactionJournal, note_live_weighings
+from log_shards import export_log, import_log_history, open_log_writer
+from serial_protocol import ProtocolParser, SerialStats
+from serial_reader import read_serial_data
+from stability import StabilityDetector
+from transactions import build_transaction, validate_transaction
+from metrics import METRICS, MetricsReporter
+from station_sync import start_sync_agent
+from save_pipeline import SaveWorker, STATUS_PENDING, STATUS_SAVED, STATUS_FAILED, STATUS_RETRYING
 
 # --- Utility Functions ---
 
-def manage_collectors_db(operation, file_name, sheet_name="Collectors"):
-    """
-    Creates or reads the database of waste collectors (recyclers).
-    """
-    if not os.path.exists(file_name):
-        try:
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = sheet_name
-            ws.append(["Collector_Name", "Collector_ID"])
-            ws.append(["Example Collector 1", "123456789"])
-            wb.save(file_name)
-        except Exception as e:
-            print(f"Error creating Excel database ('{file_name}'): {e}")
-            return {"Error": "N/A"}
-
-    try:
-        wb = openpyxl.load_workbook(file_name)
-        ws = wb[sheet_name] if sheet_name in wb.sheetnames else wb.create_sheet(sheet_name)
-        
-        if operation == "read":
-            collectors_dict = {}
-            for row in range(2, ws.max_row + 1):
-                name_cell = ws.cell(row=row, column=1).value
-                id_cell = ws.cell(row=row, column=2).value
-                
-                if name_cell:
-                    name = str(name_cell).strip()
-                    collector_id = str(id_cell).strip() if id_cell else "N/A"
-                    collectors_dict[name] = collector_id
-            
-            return collectors_dict if collectors_dict else {"Empty List": "N/A"}
-
-    except Exception as e:
-        print(f"Error reading Excel ('{file_name}'): {e}")
-        return {"Error": "N/A"}
-
 def append_data_to_excel(file_name, entry_data):
     """
     Saves the transaction to Excel. Creates a new sheet per month 
     and dynamically adds columns for materials.
+    One-shot version: loads and saves the whole workbook. The app uses
+    ExcelLogWriter, which keeps the workbook open between transactions.
     """
-    date_val = entry_data["date"]
-    collector = entry_data["collector"]
-    collector_id = entry_data["collector_id"]
-    material = entry_data["material"]
-    net_weight = float(entry_data["net_weight"])
-
-    months_en = [
-        "January", "February", "March", "April", "May", "June",
-        "July", "August", "September", "October", "November", "December"
-    ]
-    
-    # Determine Sheet Name (Month-Year)
-    try:
-        parts = date_val.split('/')
-        if len(parts) == 3:
-            day, month_num, year = parts
-            sheet_title = f"{months_en[int(month_num) - 1]}-{year}"
-        else:
-            raise ValueError("Invalid date format")
-    except Exception as e:
-        print(f"Date parse warning: {e}. Using 'General_Logs'.")
-        sheet_title = "General_Logs"
-    
-    # Standard Headers
-    HEADERS = ["DATE", "NAME", "ID", "TOTAL"]
+    sheet_title = sheet_title_for_date(entry_data["date"])
 
     try:
-        if os.path.exists(file_name):
-            wb = openpyxl.load_workbook(file_name)
-            ws = wb[sheet_title] if sheet_title in wb.sheetnames else wb.create_sheet(sheet_title)
-        else:
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = sheet_title
-
-        # Initialize Headers if new sheet
-        if ws.cell(row=1, column=1).value is None:
-            for idx, header in enumerate(HEADERS):
-                ws.cell(row=1, column=idx + 1).value = header
-
-        headers_list = [cell.value for cell in ws[1]]
-        
-        # Helper to find or create column
-        def get_col_idx(col_name):
-            nonlocal headers_list
-            try:
-                return headers_list.index(col_name) + 1
-            except ValueError:
-                # Insert new material before 'TOTAL' or at the end
-                try:
-                    total_idx = headers_list.index("TOTAL")
-                except ValueError:
-                    total_idx = len(headers_list)
-                    ws.cell(row=1, column=total_idx + 1).value = "TOTAL"
-                    headers_list.append("TOTAL")
-
-                ws.insert_cols(total_idx + 1)
-                ws.cell(row=1, column=total_idx + 1).value = col_name
-                headers_list.insert(total_idx, col_name)
-                return total_idx + 1
-
-        date_idx = get_col_idx("DATE")
-        name_idx = get_col_idx("NAME")
-        id_idx = get_col_idx("ID")
-        mat_idx = get_col_idx(material)
-        total_idx = get_col_idx("TOTAL")
-
-        # Check if row exists for this collector on this date
-        target_row = -1
-        for r in range(2, ws.max_row + 1):
-            if ws.cell(row=r, column=date_idx).value == date_val and \
-               ws.cell(row=r, column=name_idx).value == collector:
-                target_row = r
-                break
-        
-        # Create new row if not found
-        if target_row == -1:
-            target_row = ws.max_row + 1
-            ws.cell(row=target_row, column=date_idx).value = date_val
-            ws.cell(row=target_row, column=name_idx).value = collector
-            ws.cell(row=target_row, column=id_idx).value = collector_id
-            
-            # Initialize other numeric columns to 0
-            for c in range(1, len(headers_list) + 1):
-                if c not in [date_idx, name_idx, id_idx]:
-                    if ws.cell(row=target_row, column=c).value is None:
-                        ws.cell(row=target_row, column=c).value = 0.0
-
-        # Update values
-        current_mat_val = float(ws.cell(row=target_row, column=mat_idx).value or 0.0)
-        ws.cell(row=target_row, column=mat_idx).value = current_mat_val + net_weight
-        
-        current_total_val = float(ws.cell(row=target_row, column=total_idx).value or 0.0)
-        ws.cell(row=target_row, column=total_idx).value = current_total_val + net_weight
-
-        wb.save(file_name)
+        wb = openpyxl.load_workbook(file_name) if os.path.exists(file_name) else openpyxl.Workbook()
+        apply_transaction(get_log_sheet(wb, sheet_title, CATALOG.get().log_schedule), entry_data)
+        save_workbook_atomic(wb, file_name)
         return True
 
     except Exception as e:
@@ -193,52 +52,39 @@ def append_data_to_excel(file_name, entry_data):
         messagebox.showerror("Save Error", f"Could not save to '{sheet_title}'.\nError: {e}\nEnsure file is closed.")
         return False
 
-def handle_serial_error(gui_app, port):
-    if gui_app.running:
-        messagebox.showerror("Connection Error", f"Lost connection to {port}.\nApplication will close.")
-        if gui_app.winfo_exists():
-            gui_app.destroy()
-
-def read_serial_data(port, baud_rate, gui_app):
-    ser = None
-    try:
-        ser = serial.Serial(port, baud_rate, timeout=1)
-        print(f"Opening serial port {port} at {baud_rate} baud...")
-        time.sleep(2)
-        while gui_app.running:
-            if ser.in_waiting > 0:
-                line = ser.readline().decode('utf-8').strip()
-                if line: gui_app.process_serial_line(line)
-            time.sleep(0.1)
-    except serial.SerialException:
-        print(f"Connection failed on {port}.")
-        if gui_app.running:
-            gui_app.after(0, handle_serial_error, gui_app, port)
-    except Exception as e:
-        print(f"Unexpected serial thread error: {e}")
-    finally:
-        if ser and ser.is_open: ser.close()
-        print("Serial port closed.")
-
-# --- Main GUI Class ---
+# --- Weighing Panel ---
 
-class RecyclingApp(ctk.CTk):
-    def __init__(self, selected_port):
-        super().__init__()
+class ScalePanel(ctk.CTkFrame):
+    """
+    Weighing panel for one serial port: live weights, transaction inputs and
+    the register button. Saves go through the application's shared writer.
+    """
+    def __init__(self, master, app, port):
+        super().__init__(master, fg_color="transparent")
+        self.app = app
+        self.serial_port = port
+        self.connected = True
         
         self.weight_lock = threading.Lock()
-        self.serial_port = selected_port
         self.current_gross_weight = 0.0
-        self.running = True
-        
-        self.collectors_db = manage_collectors_db("read", COLLECTORS_DB_FILE)
-        collector_names = sorted(list(self.collectors_db.keys()))
-
-        self.title(f"Registration System - {self.serial_port}")
-        self.geometry("800x650") 
-        self.resizable(True, True)
+        self.current_date = None
+        self.ui_update_pending = False
+        self.ui_dispatch_started = None
+        self.serial_stats = SerialStats()
+        self.parser = ProtocolParser(self.serial_stats)
+        self.stability = StabilityDetector(STABILITY_TOLERANCE_KG, STABILITY_HOLD_S)
+        self.is_stable = False
+        self.streamed_seen = 0          # serial_stats.readings_streamed at the last reading
+        self.stream_seen_at = None      # When the last streamed reading arrived
+        self.has_stream = False         # Stability needs the firmware's live stream
+        self.captured_weight = None     # Stable weight locked into the form
+        self.logged_weight = None       # Weight of the scale's logged weighing (button 3), held until reset_fields
+        self.live_weight = 0.0          # Newest reading, for the live display
+        self.date_from_capture = False  # current_date is the PC date of a capture, not a logged weighing
+        self.capture_armed = True       # Cleared after a capture until the load is removed
+        self.auto_capture_mode = AUTO_CAPTURE_MODE
         self.grid_columnconfigure(0, weight=1)
-        
+
         # Variables
         self.date_var = ctk.StringVar(value="Waiting...")
         self.gross_weight_var = ctk.StringVar(value="0.00 kg")
@@ -248,31 +94,21 @@ class RecyclingApp(ctk.CTk):
         self.selected_category = ctk.StringVar(value="Select Category")
         self.selected_material = ctk.StringVar(value="Select Material")
         self.selected_collector = ctk.StringVar(value="Select Collector")
-        
-        # Icons
-        self.refresh_icon = None
-        if os.path.exists(REFRESH_ICON_PATH):
-            try:
-                self.refresh_icon = ctk.CTkImage(Image.open(REFRESH_ICON_PATH), size=(20, 20))
-            except Exception as e:
-                print(f"Error loading icon: {e}")
-        else:
-             print(f"Warning: Icon '{REFRESH_ICON_PATH}' not found.")
+        self.serial_stats_var = ctk.StringVar(value=self.serial_stats.summary())
+        self.stability_var = ctk.StringVar(value="Waiting...")
+        self.auto_capture_var = ctk.StringVar(value=AUTO_CAPTURE_LABELS.get(AUTO_CAPTURE_MODE, "Off"))
 
-        self.create_widgets(collector_names)
-        self.start_serial_thread()
-        self.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.create_widgets()
 
-    def create_widgets(self, collector_list):
-        # Logo
-        if os.path.exists(LOGO_PATH):
-            try:
-                ctk.CTkLabel(self, image=ctk.CTkImage(Image.open(LOGO_PATH), size=LOGO_SIZE), text="").grid(row=0, column=0, padx=20, pady=(10, 5), sticky="n")
-            except Exception as e: print(f"Error loading logo: {e}")
-        
+    @property
+    def running(self):
+        # Checked by the serial thread
+        return self.app.running and self.connected
+
+    def create_widgets(self):
         # Data Display Frame
         data_frame = ctk.CTkFrame(self)
-        data_frame.grid(row=1, column=0, padx=20, pady=15, sticky="ew")
+        data_frame.grid(row=0, column=0, padx=0, pady=(0, 15), sticky="ew")
         data_frame.grid_columnconfigure(1, weight=1)
         
         ctk.CTkLabel(data_frame, text="Date:", font=ctk.CTkFont(weight="bold")).grid(row=0, column=0, padx=10, pady=5, sticky="w")
@@ -287,14 +123,25 @@ class RecyclingApp(ctk.CTk):
         ctk.CTkLabel(data_frame, text="Net Weight:", font=ctk.CTkFont(weight="bold")).grid(row=4, column=0, padx=10, pady=10, sticky="w")
         ctk.CTkLabel(data_frame, textvariable=self.net_weight_var).grid(row=4, column=1, padx=10, pady=10, sticky="w")
 
+        ctk.CTkLabel(data_frame, text="Reading:", font=ctk.CTkFont(weight="bold")).grid(row=1, column=0, padx=10, pady=5, sticky="w")
+        self.stability_label = ctk.CTkLabel(data_frame, textvariable=self.stability_var, text_color="gray")
+        self.stability_label.grid(row=1, column=1, padx=10, pady=5, sticky="w")
+
+        ctk.CTkLabel(data_frame, text="Auto capture:").grid(row=1, column=2, padx=10, pady=5, sticky="e")
+        self.auto_capture_button = ctk.CTkSegmentedButton(data_frame, values=list(AUTO_CAPTURE_LABELS.values()), variable=self.auto_capture_var, command=self.set_auto_capture_mode, state="disabled")
+        self.auto_capture_button.grid(row=1, column=3, padx=10, pady=5, sticky="e")
+
+        ctk.CTkLabel(data_frame, textvariable=self.serial_stats_var, text_color="gray", font=ctk.CTkFont(size=11)).grid(row=5, column=0, columnspan=4, padx=10, pady=(0, 5), sticky="w")
+
         # Input Frame
         input_frame = ctk.CTkFrame(self)
-        input_frame.grid(row=2, column=0, padx=20, pady=25, sticky="nsew")
+        input_frame.grid(row=1, column=0, padx=0, pady=(10, 15), sticky="nsew")
         input_frame.grid_columnconfigure((1, 3), weight=1)
 
         # Materials
         ctk.CTkLabel(input_frame, text="Category:").grid(row=0, column=0, padx=10, pady=10, sticky="w")
-        ctk.CTkComboBox(input_frame, variable=self.selected_category, values=list(MATERIALS_BY_CATEGORY.keys()), state="readonly", command=self.update_material_list).grid(row=0, column=1, padx=10, pady=10, sticky="ew")
+        self.category_menu = ctk.CTkComboBox(input_frame, variable=self.selected_category, values=list(CATALOG.get().categories), state="readonly", command=self.update_material_list)
+        self.category_menu.grid(row=0, column=1, padx=10, pady=10, sticky="ew")
         
         ctk.CTkLabel(input_frame, text="Material:").grid(row=1, column=0, padx=10, pady=10, sticky="w")
         self.material_menu = ctk.CTkComboBox(input_frame, variable=self.selected_material, values=[], state="disabled")
@@ -302,7 +149,8 @@ class RecyclingApp(ctk.CTk):
 
         # Packaging
         ctk.CTkLabel(input_frame, text="Packaging:").grid(row=1, column=2, padx=10, pady=10, sticky="w")
-        ctk.CTkComboBox(input_frame, variable=self.selected_packaging, values=list(PACKAGING_WEIGHTS.keys()), state="readonly", command=self.update_weights).grid(row=1, column=3, padx=10, pady=10, sticky="ew")
+        self.packaging_menu = ctk.CTkComboBox(input_frame, variable=self.selected_packaging, values=list(CATALOG.get().tares), state="readonly", command=self.update_weights)
+        self.packaging_menu.grid(row=1, column=3, padx=10, pady=10, sticky="ew")
 
         # Collector Selection
         ctk.CTkLabel(input_frame, text="Collector:").grid(row=0, column=2, padx=(20, 10), pady=10, sticky="w")
@@ -310,75 +158,262 @@ class RecyclingApp(ctk.CTk):
         collector_frame.grid(row=0, column=3, padx=10, pady=10, sticky="ew")
         collector_frame.grid_columnconfigure(0, weight=1)
         
-        self.collector_menu = ctk.CTkComboBox(collector_frame, variable=self.selected_collector, values=collector_list, state="readonly")
+        # Type-ahead: typing a name or ID narrows the dropdown to the best matches
+        self.collector_menu = ctk.CTkComboBox(collector_frame, variable=self.selected_collector, values=self.app.collector_index.search("", COLLECTOR_MATCH_LIMIT), state="normal")
         self.collector_menu.grid(row=0, column=0, sticky="ew")
+        self.collector_menu.bind("<KeyRelease>", self.on_collector_typed)
+        self.collector_menu.bind("<FocusIn>", self.on_collector_focus)
+        self.collector_menu.bind("<FocusOut>", lambda _: self.after(200, self.hide_collector_matches))
+
+        # Matches are listed under the entry while typing; the entry keeps the focus
+        self.collector_searching = False
+        self.collector_matches = tk.Listbox(collector_frame, height=6, activestyle="none", exportselection=False, takefocus=0, relief="flat", highlightthickness=1, highlightbackground="gray", selectbackground="#4EB9D7")
+        self.collector_matches.grid(row=1, column=0, pady=(2, 0), sticky="ew")
+        self.collector_matches.grid_remove()
+        self.collector_matches.bind("<<ListboxSelect>>", self.on_collector_picked)
         
         # Refresh Button
-        refresh_text = "" if self.refresh_icon else "Refresh"
-        refresh_width = 35 if self.refresh_icon else 80
+        refresh_text = "" if self.app.refresh_icon else "Refresh"
+        refresh_width = 35 if self.app.refresh_icon else 80
         ctk.CTkButton(
             collector_frame, 
             text=refresh_text, 
-            image=self.refresh_icon, 
+            image=self.app.refresh_icon, 
             width=refresh_width,
-            command=self.refresh_collectors,
+            command=self.app.refresh_collectors,
             fg_color="gray", 
             hover_color="darkgray"
         ).grid(row=0, column=1, padx=(10,0))
-        
-        # Main Buttons
-        ctk.CTkButton(self, text="Register Transaction", command=self.save_data, font=ctk.CTkFont(weight="bold"), height=40, fg_color="#4EB9D7", hover_color="#357D92").grid(row=3, column=0, padx=20, pady=(10, 5), sticky="ew")
-        ctk.CTkButton(self, text="Open Log File", command=self.open_log_file, font=ctk.CTkFont(weight="bold"), height=40, fg_color="#4ED761", hover_color="#3BA249").grid(row=4, column=0, padx=20, pady=(5, 5), sticky="ew")
-        ctk.CTkButton(self, text="Manage Database", command=self.open_db_file, font=ctk.CTkFont(weight="bold"), height=40, fg_color="#46bb58", hover_color="#3BA249").grid(row=5, column=0, padx=20, pady=(5, 20), sticky="ew")
-
-    def open_db_file(self):
-        manage_collectors_db("leer", COLLECTORS_DB_FILE)
-        try:
-            webbrowser.open(os.path.abspath(COLLECTORS_DB_FILE))
-        except Exception as e:
-            messagebox.showerror("Error", f"Could not open file:\n{e}")
 
-    def refresh_collectors(self):
-        print("Refreshing collector list...")
-        self.collectors_db = manage_collectors_db("read", COLLECTORS_DB_FILE)
-        new_list = sorted(list(self.collectors_db.keys()))
-        
-        self.collector_menu.configure(values=new_list)
-        self.selected_collector.set("Select Collector")
-        messagebox.showinfo("Updated", "Collector list refreshed from Excel.")
+        self.register_button = ctk.CTkButton(self, text="Register Transaction", command=self.save_data, font=ctk.CTkFont(weight="bold"), height=40, fg_color="#4EB9D7", hover_color="#357D92")
+        self.register_button.grid(row=2, column=0, padx=0, pady=(0, 5), sticky="ew")
+
+    def on_collector_focus(self, _=None):
+        if self.selected_collector.get() == "Select Collector":
+            self.selected_collector.set("")
+
+    def on_collector_typed(self, event=None):
+        matches = self.refresh_collector_matches()
+        key = event.keysym if event is not None else None
+        # Enter picks the best match, Escape closes the list
+        if key in ("Return", "KP_Enter") and matches:
+            self.selected_collector.set(matches[0])
+        if key in ("Return", "KP_Enter", "Escape"):
+            self.hide_collector_matches()
+        else:
+            self.show_collector_matches(matches)
+
+    def on_collector_picked(self, _=None):
+        selection = self.collector_matches.curselection()
+        if selection:
+            self.selected_collector.set(self.collector_matches.get(selection[0]))
+            self.refresh_collector_matches()
+        self.hide_collector_matches()
+        self.collector_menu.focus_set()
+
+    def refresh_collector_matches(self):
+        text = self.selected_collector.get()
+        if text == "Select Collector": text = ""
+        matches = self.app.collector_index.search(text, COLLECTOR_MATCH_LIMIT)
+        self.collector_menu.configure(values=matches)
+        return matches
+
+    def show_collector_matches(self, matches):
+        # Listed while the entry holds a partial name or ID
+        text = self.selected_collector.get()
+        if not text or text == "Select Collector" or text in self.app.collectors_db or not matches:
+            self.hide_collector_matches(); return
+        self.collector_searching = True
+        self.collector_matches.delete(0, "end")
+        self.collector_matches.insert("end", *matches)
+        self.collector_matches.configure(height=min(len(matches), 6))
+        self.collector_matches.grid()
+
+    def hide_collector_matches(self):
+        self.collector_searching = False
+        self.collector_matches.grid_remove()
+
+    def collector_list_changed(self):
+        matches = self.refresh_collector_matches()
+        # A search being typed is re-run on the new list
+        if self.collector_searching:
+            self.show_collector_matches(matches)
+        # Keep the operator's choice if the collector is still listed
+        elif self.selected_collector.get() not in self.app.collectors_db:
+            self.selected_collector.set("Select Collector")
 
     def update_material_list(self, category):
-        materials = MATERIALS_BY_CATEGORY.get(category, [])
+        materials = list(CATALOG.get().categories.get(category, ()))
         self.material_menu.configure(values=materials, state="readonly" if materials else "disabled")
         self.selected_material.set("Select Material" if materials else "No materials")
 
+    def catalog_changed(self, catalog):
+        self.category_menu.configure(values=list(catalog.categories))
+        self.packaging_menu.configure(values=list(catalog.tares))
+        # Keep the operator's choices that are still in the catalog
+        category, material = self.selected_category.get(), self.selected_material.get()
+        if category in catalog.categories:
+            self.material_menu.configure(values=list(catalog.categories[category]))
+            if (category, material) not in catalog.logged_names: self.selected_material.set("Select Material")
+        elif "Select" not in category:
+            self.reset_fields()
+        if self.selected_packaging.get() not in catalog.tares:
+            self.selected_packaging.set("None" if "None" in catalog.tares else next(iter(catalog.tares)))
+        self.update_weights()
+
     def start_serial_thread(self):
-        self.serial_thread = threading.Thread(target=read_serial_data, args=(self.serial_port, BAUD_RATE, self), daemon=True)
+        self.serial_thread = threading.Thread(target=read_serial_data, args=(self.serial_port, BAUD_RATE, self, self.parser), daemon=True)
         self.serial_thread.start()
     
-    def process_serial_line(self, line):
-        # Matches: "Date: 12/12/2025, Weight: 10.50" 
-        full_match = re.match(r'Date: ([\d/]+)(?:, Weight: ([\d.]+))?', line)
-        
-        if full_match:
-            date_str, weight_str = full_match.groups()
-            weight = float(weight_str) if weight_str else self.current_gross_weight
-            self.update_ui_data(date_str, weight)
-        elif re.match(r'^([\d.]+)$', line): #if line has separate weight only 
-            self.update_ui_data(self.date_var.get(), float(line))
-
-    def update_ui_data(self, date_str, gross_weight):
+    def report_serial_error(self, port):
+        # Called from the serial thread
+        self.after(0, self.app.handle_serial_error, self)
+
+    def set_disconnected(self):
+        self.connected = False
+        self.date_var.set("Disconnected")
+        self.register_button.configure(state="disabled")
+
+    def set_auto_capture_mode(self, label):
+        modes = {v: k for k, v in AUTO_CAPTURE_LABELS.items()}
         with self.weight_lock:
-            self.current_gross_weight = float(gross_weight)
-        
-        self.after(0, self._update_gui_labels, date_str)
+            self.auto_capture_mode = modes.get(label, "off")
+            if self.auto_capture_mode == "off":
+                self.captured_weight = None
+
+    def process_reading(self, date_str, gross_weight, weighings=()):
+        # Called from the serial thread with the newest reading of a burst.
+        # The operator registers weighings; the newest logged one is pinned
+        # in the form, streamed readings only move the live display
+        note_live_weighings(self.app.journal, self.serial_port, weighings)
+        streamed = self.serial_stats.readings_streamed
+        if streamed != self.streamed_seen:
+            self.streamed_seen = streamed
+            self.stream_seen_at = time.monotonic()
+        self.update_ui_data(date_str, gross_weight, weighings[-1].weight if weighings else None)
+
+    def update_ui_data(self, date_str, gross_weight, logged_weight=None):
+        with self.weight_lock:
+            if date_str is not None:
+                self.current_date = date_str
+                self.date_from_capture = False
+            if logged_weight is not None: self.logged_weight = float(logged_weight)
+            self.has_stream = self.stream_seen_at is not None and time.monotonic() - self.stream_seen_at < STREAM_TIMEOUT_S
+            # Date-only lines keep the current weight
+            captured = self._update_weight(float(gross_weight)) if gross_weight is not None else False
+            live_state = self.live_state() if self.app.live_server else None
+            # Only one label refresh is queued at a time; it shows the newest values
+            refresh = captured or not self.ui_update_pending
+            if refresh:
+                self.ui_update_pending = True
+                self.ui_dispatch_started = METRICS.start()
+
+        if live_state is not None:
+            self.app.live_server.publish(self.serial_port, live_state)
+        if refresh:
+            self.after(0, self._update_gui_labels, captured)
+
+    def live_state(self):
+        # Called with weight_lock held; frame sent to API subscribers
+        return {
+            "type": "weight",
+            "date": self.current_date,
+            "weight": round(self.current_gross_weight, 2),
+            "live_weight": round(self.live_weight, 2),
+            "stable": self.is_stable,
+            "captured": self.captured_weight is not None,
+        }
 
-    def _update_gui_labels(self, date_str):
-        if date_str != "Waiting...": self.date_var.set(date_str)
+    def _update_weight(self, weight):
+        # Called with weight_lock held; returns True when a stable weight was captured
+        self.live_weight = weight
+        if not self.has_stream:
+            # Firmware without the live stream sends one reading per weighing
+            self.stability.reset()
+            self.is_stable = False
+            self.captured_weight = None
+            self._update_form_weight()
+            return False
+        captured = False
+        was_stable = self.is_stable
+        self.is_stable = self.stability.update(weight)
+
+        # Removing the load releases the capture and re-arms it
+        if weight < AUTO_CAPTURE_MIN_KG:
+            self.captured_weight = None
+            self.capture_armed = True
+            if self.date_from_capture:
+                self.current_date = None
+                self.date_from_capture = False
+        elif self.is_stable and not was_stable and self.capture_armed and self.auto_capture_mode != "off":
+            self.captured_weight = round(self.stability.mean, 2)
+            self.capture_armed = False
+            captured = True
+            if self.current_date is None:
+                # Streamed readings carry no date: a capture is dated by the PC
+                self.current_date = datetime.now().strftime("%d/%m/%Y")
+                self.date_from_capture = True
+
+        self._update_form_weight()
+        return captured
+
+    def _update_form_weight(self):
+        # Called with weight_lock held. A logged weighing stays in the form
+        # until it is registered, even after the load is removed
+        if self.logged_weight is not None:
+            self.current_gross_weight = self.logged_weight
+        elif self.captured_weight is not None:
+            self.current_gross_weight = self.captured_weight
+        else:
+            self.current_gross_weight = self.live_weight
+
+    def _update_gui_labels(self, captured=False):
+        with self.weight_lock:
+            self.ui_update_pending = False
+            METRICS.stop("ui_dispatch", self.ui_dispatch_started)
+            self.ui_dispatch_started = None
+            date_str = self.current_date
+            is_stable = self.is_stable
+            has_stream = self.has_stream
+            captured_weight = self.captured_weight
+            logged_weight = self.logged_weight
+            live_weight = self.live_weight
+        if date_str is not None: self.date_var.set(date_str)
+        elif self.connected: self.date_var.set("Waiting...")
+        self.serial_stats_var.set(self.serial_stats.summary())
+
+        self.auto_capture_button.configure(state="normal" if has_stream else "disabled")
+        if logged_weight is not None:
+            self.stability_var.set(f"Logged {logged_weight:.2f} kg (scale now {live_weight:.2f} kg)")
+            self.stability_label.configure(text_color="#357D92")
+        elif not has_stream:
+            self.stability_var.set("No live stream")
+            self.stability_label.configure(text_color="gray")
+        elif captured_weight is not None:
+            self.stability_var.set(f"Captured {captured_weight:.2f} kg")
+            self.stability_label.configure(text_color="#357D92")
+        else:
+            self.stability_var.set("Stable" if is_stable else "Settling...")
+            self.stability_label.configure(text_color="green" if is_stable else "orange")
         self.update_weights()
-        
+
+        if captured and self.auto_capture_mode == "register":
+            self.auto_register()
+
+    def auto_register(self):
+        # Only saves when the operator already filled the form; otherwise the
+        # captured weight just stays pre-filled
+        if self.date_var.get() == "Waiting..." or \
+           any("Select" in v for v in [self.selected_category.get(), self.selected_material.get(), self.selected_collector.get()]) or \
+           self.selected_collector.get() not in self.app.collectors_db:
+            return
+        net_weight = float(self.net_weight_var.get().replace(" kg", ""))
+        if net_weight <= 0:
+            return
+        self.save_data()
+
     def update_weights(self, _=None):
-        tare = PACKAGING_WEIGHTS.get(self.selected_packaging.get(), 0.0)
+        tare = CATALOG.get().tares.get(self.selected_packaging.get(), 0.0)
         
         with self.weight_lock:
             current_gross = self.current_gross_weight
@@ -388,64 +423,447 @@ class RecyclingApp(ctk.CTk):
         self.net_weight_var.set(f"{current_gross - tare:.2f} kg")
 
     def save_data(self):
-        net_str = self.net_weight_var.get().replace(" kg", "")
         collector_name = self.selected_collector.get()
-        
+        problem = validate_transaction(
+            self.date_var.get(), self.selected_packaging.get(), self.selected_category.get(),
+            self.selected_material.get(), collector_name, self.app.collectors_db
+        )
+        if problem:
+            messagebox.showwarning(*problem); return
+
         with self.weight_lock:
             current_gross = self.current_gross_weight
-        
-        collector_id = self.collectors_db.get(collector_name, "N/A")
-            
-        data = {
-            "date": self.date_var.get(),
-            "gross_weight": current_gross,
-            "packaging": self.selected_packaging.get(),
-            "tare": PACKAGING_WEIGHTS.get(self.selected_packaging.get(), 0.0),
-            "net_weight": float(net_str),
-            "category": self.selected_category.get(),
-            "material": self.selected_material.get().upper(),
-            "collector": collector_name.upper(),
-            "collector_id": collector_id, 
-        }
-        
-        # Validation
-        if any(v in ("Waiting...", "N/A") for v in [data["date"]]) or \
-           any("Select" in v for v in [data["category"], data["material"], data["collector"]]):
-            messagebox.showwarning("Incomplete Data", "Please fill all fields and wait for scale data."); return
-        
-        if data["net_weight"] <= 0:
-            if not messagebox.askyesno("Zero/Negative Weight", f"Net weight is {data['net_weight']:.2f} kg. Register anyway?"): return
-
-        if append_data_to_excel(EXCEL_LOG_FILE, data):
-            messagebox.showinfo("Success", "Transaction saved successfully.")
+        net_weight = round(current_gross - CATALOG.get().tares.get(self.selected_packaging.get(), 0.0), 2)
+        if net_weight <= 0:
+            if not messagebox.askyesno("Zero/Negative Weight", f"Net weight is {net_weight:.2f} kg. Register anyway?"): return
+
+        claim = self.claim_weighing()
+        if claim is None:
+            messagebox.showwarning("Already Registered", "This weighing was already registered."); return
+        data = build_transaction(
+            claim["date"], claim["gross"], self.selected_packaging.get(), self.selected_category.get(),
+            self.selected_material.get(), collector_name, self.app.collectors_db, self.serial_port
+        )
+
+        if self.app.submit_transaction(data):
             self.reset_fields()
+        else:
+            self.release_weighing(claim)
+
+    def remote_transaction(self, packaging, category, material, collector, allow_zero=False):
+        """
+        Claims the pending weighing and builds a transaction from it for the
+        API server. Raises ValueError with the reason if it cannot be
+        registered; release_weighing() puts it back if the save is refused.
+        """
+        with self.weight_lock:
+            date_str = self.current_date
+            current_gross = self.current_gross_weight
+        if not self.connected: date_str = None
+
+        problem = validate_transaction(date_str, packaging, category, material, collector, self.app.collectors_db)
+        if problem:
+            raise ValueError(problem[1])
+        net_weight = round(current_gross - CATALOG.get().tares.get(packaging, 0.0), 2)
+        if net_weight <= 0 and not allow_zero:
+            raise ValueError(f"Net weight is {net_weight:.2f} kg. Send allow_zero to register anyway.")
+
+        claim = self.claim_weighing()
+        if claim is None:
+            raise ValueError("This weighing was already registered.")
+        return claim, build_transaction(claim["date"], claim["gross"], packaging, category, material, collector, self.app.collectors_db, self.serial_port)
+
+    def claim_weighing(self):
+        """
+        Takes the pending weighing out of the form in one step, so the
+        Register button and the API cannot both save it. Returns its date,
+        gross weight and state for release_weighing(), or None if there is
+        no weighing to register.
+        """
+        with self.weight_lock:
+            if self.current_date is None: return None
+            claim = {
+                "date": self.current_date, "gross": self.current_gross_weight,
+                "captured": self.captured_weight, "logged": self.logged_weight,
+                "from_capture": self.date_from_capture,
+            }
+            self.current_date = None
+            self.captured_weight = None
+            self.logged_weight = None
+            self.date_from_capture = False
+            self._update_form_weight()
+        return claim
+
+    def release_weighing(self, claim):
+        # The save was refused: put the weighing back unless a new one arrived
+        with self.weight_lock:
+            if self.current_date is not None: return
+            self.current_date = claim["date"]
+            self.captured_weight = claim["captured"]
+            self.logged_weight = claim["logged"]
+            self.date_from_capture = claim["from_capture"]
+            self._update_form_weight()
 
     def reset_fields(self):
         self.selected_category.set("Select Category")
         self.material_menu.configure(values=[], state="disabled")
         self.selected_material.set("Select Material")
         self.selected_collector.set("Select Collector")
+        self.refresh_collector_matches()
+        self.hide_collector_matches()
         self.selected_packaging.set("None")
         self.date_var.set("Waiting...")
         
         with self.weight_lock:
             self.current_gross_weight = 0.0
+            self.current_date = None
+            self.captured_weight = None
+            self.logged_weight = None
+            self.date_from_capture = False
         self.update_weights()
 
+# --- Main GUI Class ---
+
+class RecyclingApp(ctk.CTk):
+    """
+    Main window. Drives one weighing panel per serial port; all panels share
+    the journal, the Excel log and a single background writer, so several
+    scales can register transactions without conflicting saves.
+    """
+    def __init__(self, selected_ports):
+        super().__init__()
+        
+        if isinstance(selected_ports, str): selected_ports = [selected_ports]
+        self.serial_ports = list(selected_ports)
+        self.running = True
+        self.journal = TransactionJournal(JOURNAL_FILE)
+        import_log_history(self.journal, EXCEL_LOG_FILE)
+        self.log_writer = open_log_writer(EXCEL_LOG_FILE, LOG_SHARDING, LOG_FLUSH_EVERY, LOG_FLUSH_INTERVAL_S, CATALOG.get().log_schedule)
+        self.save_statuses = {}
+        self.ticket_ports = {}
+        self.live_server = None
+        self.save_worker = SaveWorker(
+            self.journal, self.log_writer, self.report_save_status,
+            max_queue=SAVE_QUEUE_SIZE, retry_delay=SAVE_RETRY_DELAY_S
+        )
+        self.save_worker.start()
+        
+        self.collector_directory = CollectorDirectory(COLLECTORS_DB_FILE)
+        self.collectors_db = self.collector_directory.get()
+        self.collector_index = self.collector_directory.index
+
+        self.title(f"Registration System - {', '.join(self.serial_ports)}")
+        self.geometry("800x740" if len(self.serial_ports) == 1 else "800x800") 
+        self.resizable(True, True)
+        self.grid_columnconfigure(0, weight=1)
+        
+        # Icons
+        self.refresh_icon = None
+        if os.path.exists(REFRESH_ICON_PATH):
+            try:
+                self.refresh_icon = ctk.CTkImage(Image.open(REFRESH_ICON_PATH), size=(20, 20))
+            except Exception as e:
+                print(f"Error loading icon: {e}")
+        else:
+             print(f"Warning: Icon '{REFRESH_ICON_PATH}' not found.")
+
+        self.create_widgets()
+        for panel in self.panels:
+            panel.start_serial_thread()
+        if API_ENABLED:
+            self.start_live_server()
+        self.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.bind("<F12>", self.open_diagnostics)
+        self.diagnostics_window = None
+        if METRICS_ENABLED: METRICS.enable()
+        self.metrics_reporter = MetricsReporter(METRICS, METRICS_LOG_INTERVAL_S, METRICS_FILE or None)
+        self.metrics_reporter.start()
+        self.sync_agent = start_sync_agent(self.journal)
+        self.collector_directory.start_watching(
+            COLLECTORS_WATCH_INTERVAL_S,
+            lambda collectors: self.after(0, self._on_collectors_changed, collectors)
+        )
+        CATALOG.start_watching(
+            CATALOG_WATCH_INTERVAL_S,
+            lambda catalog: self.after(0, self._on_catalog_changed, catalog)
+        )
+
+    def create_widgets(self):
+        # Logo
+        if os.path.exists(LOGO_PATH):
+            try:
+                ctk.CTkLabel(self, image=ctk.CTkImage(Image.open(LOGO_PATH), size=LOGO_SIZE), text="").grid(row=0, column=0, padx=20, pady=(10, 5), sticky="n")
+            except Exception as e: print(f"Error loading logo: {e}")
+
+        # One panel per scale; tabs when there is more than one
+        self.panels = []
+        if len(self.serial_ports) == 1:
+            panel = ScalePanel(self, self, self.serial_ports[0])
+            panel.grid(row=1, column=0, padx=20, pady=(15, 0), sticky="nsew")
+            self.panels.append(panel)
+        else:
+            tabs = ctk.CTkTabview(self)
+            tabs.grid(row=1, column=0, padx=20, pady=(5, 0), sticky="nsew")
+            for port in self.serial_ports:
+                tab = tabs.add(port)
+                tab.grid_columnconfigure(0, weight=1)
+                panel = ScalePanel(tab, self, port)
+                panel.grid(row=0, column=0, sticky="nsew")
+                self.panels.append(panel)
+        
+        # Main Buttons
+        ctk.CTkButton(self, text="Open Log File", command=self.open_log_file, font=ctk.CTkFont(weight="bold"), height=40, fg_color="#4ED761", hover_color="#3BA249").grid(row=4, column=0, padx=20, pady=(5, 5), sticky="ew")
+        ctk.CTkButton(self, text="Manage Database", command=self.open_db_file, font=ctk.CTkFont(weight="bold"), height=40, fg_color="#46bb58", hover_color="#3BA249").grid(row=5, column=0, padx=20, pady=(5, 5), sticky="ew")
+        self.rebuild_button = ctk.CTkButton(self, text="Rebuild Log File", command=self.rebuild_log_file, font=ctk.CTkFont(weight="bold"), height=40, fg_color="gray", hover_color="darkgray")
+        self.rebuild_button.grid(row=6, column=0, padx=20, pady=(5, 5), sticky="ew")
+        self.report_button = ctk.CTkButton(self, text="Generate Report", command=self.generate_report, font=ctk.CTkFont(weight="bold"), height=40, fg_color="gray", hover_color="darkgray")
+        self.report_button.grid(row=7, column=0, padx=20, pady=(5, 5), sticky="ew")
+
+        # Save Status
+        self.save_status_var = ctk.StringVar(value="No transactions yet.")
+        self.save_status_label = ctk.CTkLabel(self, textvariable=self.save_status_var, text_color="gray", justify="left")
+        self.save_status_label.grid(row=8, column=0, padx=20, pady=(5, 15), sticky="w")
+
+    def open_db_file(self):
+        create_collectors_db(COLLECTORS_DB_FILE)
+        try:
+            webbrowser.open(os.path.abspath(COLLECTORS_DB_FILE))
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not open file:\n{e}")
+
+    def refresh_collectors(self):
+        print("Refreshing collector list...")
+        if self.collector_directory.refresh():
+            self._on_collectors_changed(self.collector_directory.get())
+            messagebox.showinfo("Updated", "Collector list refreshed from Excel.")
+        else:
+            messagebox.showinfo("Up to Date", "The collector list has not changed.")
+
+    def _on_collectors_changed(self, collectors):
+        # Called for the refresh button and for changes found by the watcher
+        self.collectors_db = collectors
+        self.collector_index = self.collector_directory.index
+        for panel in self.panels:
+            panel.collector_list_changed()
+
+    def _on_catalog_changed(self, catalog):
+        # Called by the watcher when the catalog file was edited
+        self.log_writer.material_schedule = catalog.log_schedule
+        for panel in self.panels:
+            panel.catalog_changed(catalog)
+        self.save_status_var.set(f"Catalog version {catalog.version} loaded.")
+
+    def start_live_server(self):
+        try:
+            from api_server import LiveServer  # aiohttp is only loaded when the API is enabled
+            server = LiveServer(
+                API_HOST, API_PORT, self.serial_ports, self.submit_remote_transaction,
+                lambda query, limit: self.collector_index.search(query, limit), API_TOKEN
+            )
+            server.start()
+            self.live_server = server
+        except Exception as e:
+            print(f"API Server Error: {e}")
+
+    def submit_remote_transaction(self, payload):
+        # Called from the API server thread; same checks as the Register button
+        panel = next((p for p in self.panels if p.serial_port == payload.get("scale")), None)
+        if panel is None:
+            raise ValueError("Unknown scale.")
+        fields = [str(payload.get(key) or "") for key in ("category", "material", "collector")]
+        claim, data = panel.remote_transaction(str(payload.get("packaging") or "None"), *fields, bool(payload.get("allow_zero")))
+        try:
+            ticket = self.save_worker.submit(data)
+        except queue.Full:
+            panel.release_weighing(claim)
+            raise
+        # Reset the form like save_data; the weighing itself was claimed already
+        self.after(0, self.ticket_ports.__setitem__, ticket, data["scale"])
+        self.after(0, panel.reset_fields)
+        return ticket
+
+    def open_diagnostics(self, _=None):
+        if self.diagnostics_window is not None and self.diagnostics_window.winfo_exists():
+            self.diagnostics_window.focus(); return
+        self.diagnostics_window = DiagnosticsWindow(self)
+
+    def handle_serial_error(self, panel):
+        if not self.running or not panel.connected: return
+        if not any(p.connected for p in self.panels if p is not panel):
+            messagebox.showerror("Connection Error", f"Lost connection to {panel.serial_port}.\nApplication will close.")
+            self._finish_closing(True, "")
+            return
+        messagebox.showerror("Connection Error", f"Lost connection to {panel.serial_port}.\nThe other scales keep working.")
+        panel.set_disconnected()
+
+    def submit_transaction(self, data):
+        # Written in the background: journal first, then the Excel log
+        try:
+            ticket = self.save_worker.submit(data)
+        except queue.Full:
+            messagebox.showwarning("Busy", "Too many transactions are waiting to be saved. Please try again in a moment."); return False
+        self.ticket_ports[ticket] = data["scale"]
+        return True
+
+    def report_save_status(self, ticket, status, message):
+        # Called from the save thread
+        if self.running:
+            self.after(0, self._update_save_status, ticket, status, message)
+
+    def _update_save_status(self, ticket, status, message):
+        if ticket is None:
+            # Log file events (locked, written again)
+            if status == STATUS_RETRYING:
+                self.save_status_label.configure(text_color="orange")
+                self.save_status_var.set(message.split("\n")[0])
+            elif status == STATUS_FAILED:
+                messagebox.showerror("Save Error", message)
+            else:
+                self.save_status_label.configure(text_color="gray")
+                self.save_status_var.set(message)
+            return
+
+        self.save_statuses[ticket] = status
+        while len(self.save_statuses) > 5:
+            oldest = next(iter(self.save_statuses))
+            del self.save_statuses[oldest]
+            self.ticket_ports.pop(oldest, None)
+
+        summary = "   ".join(f"#{t} {self.ticket_ports.get(t, '')}: {s}" for t, s in reversed(self.save_statuses.items()))
+        color = {STATUS_PENDING: "gray", STATUS_SAVED: "green", STATUS_FAILED: "red"}.get(status, "gray")
+        self.save_status_label.configure(text_color=color)
+        self.save_status_var.set(f"{summary}\n{message}")
+
+        if status == STATUS_FAILED:
+            messagebox.showerror("Save Error", f"Transaction #{ticket}: {message}")
+
+    def rebuild_log_file(self):
+        self.rebuild_button.configure(state="disabled", text="Rebuilding...")
+        # Runs on the writer thread, after the transactions already queued
+        self.save_worker.request_rebuild(self._rebuild_log, self._rebuild_log_done)
+
+    def _rebuild_log(self):
+        with self.log_writer.lock:
+            export_log(self.journal, self.log_writer, CATALOG.get().log_schedule)
+            self.log_writer.discard()
+
+    def _rebuild_log_done(self, ok, message):
+        # Called from the writer thread
+        if ok:
+            result = ("info", "Rebuilt", f"'{EXCEL_LOG_FILE}' was regenerated from the journal.")
+        else:
+            result = ("error", "Rebuild Error", f"Could not rebuild '{EXCEL_LOG_FILE}'.\nError: {message}\nEnsure file is closed.")
+        if self.running:
+            self.after(0, self._on_rebuild_done, result)
+
+    def _on_rebuild_done(self, result):
+        kind, title, message = result
+        self.rebuild_button.configure(state="normal", text="Rebuild Log File")
+        (messagebox.showinfo if kind == "info" else messagebox.showerror)(title, message)
+
+    def generate_report(self):
+        self.report_button.configure(state="disabled", text="Generating...")
+        threading.Thread(target=self._report_worker, daemon=True).start()
+
+    def _report_worker(self):
+        # The journal holds every transaction, including those not yet in the log file
+        try:
+            from reports import load_from_journal, write_report  # NumPy is only loaded when a report is made
+            table = load_from_journal(JOURNAL_FILE, CATALOG.get().material_categories)
+            write_report(table, REPORT_FILE)
+            result = None
+        except Exception as e:
+            print(f"Report Error: {e}")
+            result = f"Could not write '{REPORT_FILE}'.\nError: {e}\nEnsure file is closed."
+        if self.running:
+            self.after(0, self._on_report_done, result)
+
+    def _on_report_done(self, error):
+        self.report_button.configure(state="normal", text="Generate Report")
+        if error:
+            messagebox.showerror("Report Error", error); return
+        try:
+            webbrowser.open(os.path.abspath(REPORT_FILE))
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not open file: {e}")
+
     def open_log_file(self):
-        if not os.path.exists(EXCEL_LOG_FILE): 
-            messagebox.showwarning("Not Found", f"'{EXCEL_LOG_FILE}' does not exist yet."); return
+        # Write anything still pending before Excel opens the file
+        self.save_worker.request_flush(lambda ok, message: self.after(0, self._open_log_file_now))
+
+    def _open_log_file_now(self):
+        log_file = self.log_writer.file_name  # Current shard when the log is sharded
+        if not os.path.exists(log_file): 
+            messagebox.showwarning("Not Found", f"'{log_file}' does not exist yet."); return
         try: 
-            webbrowser.open(os.path.abspath(EXCEL_LOG_FILE))
+            webbrowser.open(os.path.abspath(log_file))
         except Exception as e: 
             messagebox.showerror("Error", f"Could not open file: {e}")
 
     def on_closing(self):
         if messagebox.askokcancel("Exit", "Do you want to close the application?"):
-            self.running = False
-            if hasattr(self, 'serial_thread') and self.serial_thread.is_alive(): 
-                self.serial_thread.join(1)
-            self.destroy()
+            self.save_worker.request_flush(lambda ok, message: self.after(0, self._finish_closing, ok, message))
+
+    def _finish_closing(self, ok, message):
+        if not ok and not messagebox.askyesno("Save Error", f"{message}\n\nAll transactions are kept in the journal and the file can be regenerated with 'Rebuild Log File'.\nClose anyway?"):
+            return
+        self.running = False
+        self.collector_directory.stop_watching()
+        CATALOG.stop_watching()
+        if self.live_server: self.live_server.stop()
+        self.metrics_reporter.stop()
+        if self.sync_agent: self.sync_agent.stop()
+        self.save_worker.stop(5)
+        for panel in self.panels:
+            if hasattr(panel, 'serial_thread') and panel.serial_thread.is_alive(): 
+                panel.serial_thread.join(1)
+        self.journal.close()
+        self.destroy()
+
+# --- Diagnostics ---
+
+class DiagnosticsWindow(ctk.CTkToplevel):
+    """
+    Debug panel (F12): switches the timing metrics on and off and shows
+    their histograms, refreshed every second.
+    """
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.title("Diagnostics")
+        self.geometry("640x360")
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        controls = ctk.CTkFrame(self, fg_color="transparent")
+        controls.grid(row=0, column=0, padx=10, pady=(10, 5), sticky="ew")
+        self.enabled_var = ctk.BooleanVar(value=METRICS.enabled)
+        ctk.CTkSwitch(controls, text="Collect timings", variable=self.enabled_var, command=self.toggle).pack(side="left")
+        ctk.CTkButton(controls, text="Reset", width=80, command=METRICS.reset, fg_color="gray", hover_color="darkgray").pack(side="right")
+
+        self.text = ctk.CTkTextbox(self, font=ctk.CTkFont(family="Courier", size=12))
+        self.text.grid(row=1, column=0, padx=10, pady=(5, 10), sticky="nsew")
+        self.refresh()
+
+    def toggle(self):
+        if self.enabled_var.get(): METRICS.enable()
+        else: METRICS.disable()
+
+    def refresh(self):
+        if not self.winfo_exists(): return
+        lines = [f"{'Metric':<16}{'Count':>9}{'p50 (ms)':>12}{'p95 (ms)':>12}{'Max (ms)':>12}"]
+        for name, count, p50, p95, maximum in METRICS.summary():
+            lines.append(f"{name:<16}{count:>9}{p50 * 1000:>12.2f}{p95 * 1000:>12.2f}{maximum * 1000:>12.2f}")
+        if len(lines) == 1:
+            lines.append("No samples yet." if METRICS.enabled else "Timings are off.")
+        for panel in self.app.panels:
+            lines.append(f"\n{panel.serial_port}: {panel.serial_stats.summary()}")
+
+        self.text.configure(state="normal")
+        self.text.delete("1.0", "end")
+        self.text.insert("1.0", "\n".join(lines))
+        self.text.configure(state="disabled")
+        self.after(1000, self.refresh)
 
 # --- Connection Window ---
 
@@ -453,7 +871,7 @@ class COMPortSelection(ctk.CTk):
     def __init__(self):
         super().__init__()
         self.title("Connect Device")
-        self.geometry("300x180")
+        self.geometry("300x300")
         self.resizable(False, False)
         self.grid_columnconfigure(0, weight=1)
 
@@ -463,15 +881,16 @@ class COMPortSelection(ctk.CTk):
                 self.refresh_icon = ctk.CTkImage(Image.open(REFRESH_ICON_PATH), size=(20, 20))
             except Exception: pass
         
-        ctk.CTkLabel(self, text="Select Device Port:", font=ctk.CTkFont(size=14)).pack(padx=20, pady=(20, 5))
+        ctk.CTkLabel(self, text="Select Device Ports:", font=ctk.CTkFont(size=14)).pack(padx=20, pady=(20, 5))
         
         com_frame = ctk.CTkFrame(self, fg_color="transparent")
         com_frame.pack(padx=20, pady=5, fill="x")
         com_frame.grid_columnconfigure(0, weight=1)
 
-        self.selected_port = ctk.StringVar()
-        self.port_combo = ctk.CTkComboBox(com_frame, variable=self.selected_port, state="readonly")
-        self.port_combo.grid(row=0, column=0, sticky="ew")
+        # One checkbox per port; every checked port gets its own weighing panel
+        self.port_vars = {}
+        self.port_list = ctk.CTkScrollableFrame(com_frame, height=110)
+        self.port_list.grid(row=0, column=0, sticky="ew")
 
         refresh_text = "" if self.refresh_icon else "Refresh"
         refresh_width = 35 if self.refresh_icon else 80
@@ -485,28 +904,33 @@ class COMPortSelection(ctk.CTk):
             fg_color="gray", 
             hover_color="darkgray",
             height=28
-        ).grid(row=0, column=1, padx=(10,0))
+        ).grid(row=0, column=1, padx=(10,0), sticky="n")
         
         self.refresh_ports()
 
         ctk.CTkButton(self, text="Connect", command=self.start_app, height=35, fg_color="#4EB9D7", hover_color="#357D92").pack(padx=20, pady=(10,20), fill="x", expand=True)
 
     def refresh_ports(self):
-        ports = [port.device for port in serial.tools.list_ports.comports()]
-        if ports:
-            self.port_combo.configure(values=ports)
-            self.selected_port.set(ports[0])
-        else:
-            self.port_combo.configure(values=["No ports found"])
-            self.selected_port.set("No ports found")
+        for widget in self.port_list.winfo_children():
+            widget.destroy()
+        self.port_vars = {}
+
+        ports = [port.device for port in serial.tools.list_ports.comports()] + EXTRA_PORTS
+        if not ports:
+            ctk.CTkLabel(self.port_list, text="No ports found").pack(anchor="w")
+            return
+        for idx, port in enumerate(ports):
+            var = ctk.BooleanVar(value=(idx == 0))
+            ctk.CTkCheckBox(self.port_list, text=port, variable=var).pack(anchor="w", pady=2)
+            self.port_vars[port] = var
 
     def start_app(self):
-        chosen_port = self.selected_port.get()
-        if "No ports" in chosen_port:
-            messagebox.showerror("Error", "No COM port found. Check device and refresh.")
+        chosen_ports = [port for port, var in self.port_vars.items() if var.get()]
+        if not chosen_ports:
+            messagebox.showerror("Error", "No COM port selected. Check device and refresh.")
             return
         self.destroy()
-        app = RecyclingApp(selected_port=chosen_port)
+        app = RecyclingApp(selected_ports=chosen_ports)
         app.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,223 @@
+import argparse
+import re
+import sqlite3
+import numpy as np
+import openpyxl
+from config import EXCEL_LOG_FILE, JOURNAL_FILE, REPORT_FILE
+from catalog import CATALOG
+from log_shards import shard_files
+from log_writer import LOG_HEADERS, MONTHS_EN, save_workbook_atomic
+
+PERIOD_RE = re.compile(r"\d{4}-(0[1-9]|1[0-2])")
+
+# --- Columnar Transactions ---
+
+class TransactionTable:
+    """
+    Transactions held as columns: one code array per dimension (collector,
+    material, category, period) plus a float64 weight array. Totals are
+    computed with np.bincount over the codes, so reports do not loop over
+    rows in Python. Periods are "YYYY-MM" labels and sort chronologically.
+    """
+    def __init__(self, periods, collectors, materials, weights, material_categories=None):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.labels = {}
+        self.codes = {}
+        for dim, values in (("period", periods), ("collector", collectors), ("material", materials)):
+            labels, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+            self.labels[dim] = labels
+            self.codes[dim] = codes.reshape(-1)
+
+        # Category follows from the material: map the (few) material labels,
+        # then index the mapping with the material codes
+        material_categories = material_categories or {}
+        category_of_material = np.asarray(
+            [material_categories.get(m, "Other") for m in self.labels["material"]], dtype=str
+        )
+        labels, material_to_category = np.unique(category_of_material, return_inverse=True)
+        self.labels["category"] = labels
+        self.codes["category"] = material_to_category.reshape(-1)[self.codes["material"]]
+
+    def __len__(self):
+        return len(self.weights)
+
+    def totals(self, dim):
+        """
+        Returns [(label, total)] for a dimension, largest first.
+        """
+        labels = self.labels[dim]
+        sums = np.bincount(self.codes[dim], weights=self.weights, minlength=len(labels))
+        order = np.argsort(-sums, kind="stable")
+        return [(str(labels[i]), float(sums[i])) for i in order]
+
+    def pivot(self, row_dim, col_dim):
+        """
+        Returns (row_labels, col_labels, matrix) of totals.
+        """
+        rows, cols = self.labels[row_dim], self.labels[col_dim]
+        flat = self.codes[row_dim] * len(cols) + self.codes[col_dim]
+        matrix = np.bincount(flat, weights=self.weights, minlength=len(rows) * len(cols))
+        return rows, cols, matrix.reshape(len(rows), len(cols))
+
+    def ranking(self, dim, top=None):
+        ranked = self.totals(dim)
+        return ranked[:top] if top else ranked
+
+    def month_over_month(self):
+        """
+        Returns [(period, total, change, change_pct)] in chronological order.
+        Months without weighings between the first and last one are listed
+        with a zero total; "Unknown" and other non-month periods are left
+        out. change_pct is None when the previous month had no weight.
+        """
+        periods = self.labels["period"]
+        totals = np.bincount(self.codes["period"], weights=self.weights, minlength=len(periods))
+        is_month = np.asarray([PERIOD_RE.fullmatch(p) is not None for p in periods], dtype=bool)
+        if not is_month.any():
+            return []
+        # Months as consecutive integers (year * 12 + month - 1), so gaps can be filled
+        months = np.asarray([int(p[:4]) * 12 + int(p[5:]) - 1 for p in periods[is_month]])
+        first = months.min()
+        filled = np.bincount(months - first, weights=totals[is_month])
+
+        change = np.diff(filled, prepend=np.nan)
+        previous = np.concatenate(([np.nan], filled[:-1]))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = np.where(previous > 0, change / previous * 100.0, np.nan)
+        labels = [f"{m // 12}-{m % 12 + 1:02d}" for m in range(first, first + len(filled))]
+        return [
+            (p, float(t), None if np.isnan(c) else float(c), None if np.isnan(x) else float(x))
+            for p, t, c, x in zip(labels, filled, change, pct)
+        ]
+
+# --- Loaders ---
+
+def load_from_journal(journal_file, material_categories=None):
+    """
+    Loads every journal transaction into a TransactionTable.
+    """
+    conn = sqlite3.connect(journal_file)
+    try:
+        rows = conn.execute(
+            "SELECT CASE WHEN date LIKE '__/__/____' THEN substr(date, 7, 4) || '-' || substr(date, 4, 2) "
+            "ELSE 'Unknown' END, collector, material, net_weight FROM transactions"
+        ).fetchall()
+    finally:
+        conn.close()
+    periods, collectors, materials, weights = zip(*rows) if rows else ((), (), (), ())
+    return TransactionTable(periods, collectors, materials, weights, material_categories)
+
+def period_for_sheet(sheet_title):
+    """
+    "December-2025" -> "2025-12"; other sheet names are kept as they are.
+    """
+    month, _, year = sheet_title.partition("-")
+    if month in MONTHS_EN and year.isdigit():
+        return f"{year}-{MONTHS_EN.index(month) + 1:02d}"
+    return sheet_title
+
+def load_from_excel(file_name, material_categories=None):
+    """
+    Loads the Month-Year sheets of a log workbook, or of a list of workbooks
+    (the shards of a sharded log, see log_shards.shard_files()). Each sheet
+    is read once in read-only mode into a weight matrix; non-zero cells
+    become rows.
+    """
+    periods, collectors, materials, weights = [], [], [], []
+    file_names = [file_name] if isinstance(file_name, str) else file_name
+    for name in file_names:
+        _load_workbook_sheets(name, periods, collectors, materials, weights)
+
+    if not weights:
+        return TransactionTable((), (), (), (), material_categories)
+    return TransactionTable(
+        np.concatenate(periods), np.concatenate(collectors), np.concatenate(materials),
+        np.concatenate(weights), material_categories
+    )
+
+def _load_workbook_sheets(file_name, periods, collectors, materials, weights):
+    wb = openpyxl.load_workbook(file_name, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            rows = ws.iter_rows(values_only=True)
+            headers = list(next(rows, []))
+            if "NAME" not in headers: continue
+            name_idx = headers.index("NAME")
+            material_cols = [i for i, h in enumerate(headers) if h and h not in LOG_HEADERS]
+            if not material_cols: continue
+
+            names, matrix = [], []
+            for row in rows:
+                if not row or name_idx >= len(row) or row[name_idx] is None: continue
+                names.append(str(row[name_idx]))
+                matrix.append([row[i] if i < len(row) and isinstance(row[i], (int, float)) else 0.0 for i in material_cols])
+            if not matrix: continue
+
+            matrix = np.asarray(matrix, dtype=np.float64)
+            r, c = np.nonzero(matrix)
+            sheet_materials = np.asarray([str(headers[i]) for i in material_cols], dtype=str)
+            periods.append(np.full(len(r), period_for_sheet(ws.title)))
+            collectors.append(np.asarray(names, dtype=str)[r])
+            materials.append(sheet_materials[c])
+            weights.append(matrix[r, c])
+    finally:
+        wb.close()
+
+# --- Report Workbook ---
+
+def write_report(table, file_name):
+    """
+    Writes totals, rankings and month-over-month trends to a workbook.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+
+    ws = wb.create_sheet("Summary")
+    ws.append(["PERIOD", "TOTAL (kg)", "CHANGE (kg)", "CHANGE (%)"])
+    for period, total, change, pct in table.month_over_month():
+        ws.append([period, round(total, 2),
+                   None if change is None else round(change, 2),
+                   None if pct is None else round(pct, 1)])
+    ws.append([])
+    ws.append(["GRAND TOTAL", round(float(table.weights.sum()), 2)])
+    ws.append(["TRANSACTIONS", len(table)])
+
+    for dim, title in (("collector", "By Collector"), ("material", "By Material"), ("category", "By Category")):
+        ws = wb.create_sheet(title)
+        rows, periods, matrix = table.pivot(dim, "period")
+        totals = matrix.sum(axis=1)
+        order = np.argsort(-totals, kind="stable")
+        ws.append(["RANK", dim.upper(), "TOTAL (kg)"] + [str(p) for p in periods])
+        for rank, i in enumerate(order, start=1):
+            ws.append([rank, str(rows[i]), round(float(totals[i]), 2)] + [round(float(v), 2) for v in matrix[i]])
+
+    save_workbook_atomic(wb, file_name)
+
+# --- Command Line ---
+# The Generate Report button reads the journal. Installs whose history is
+# only in the Excel log (every shard of a sharded log) can report on it:
+#
+#   python reports.py --from-log
+#   python reports.py --journal Recycling_Journal.db --out Report.xlsx
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write totals, rankings and monthly trends to a report workbook.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--journal", default=JOURNAL_FILE, help="Journal to read (default)")
+    source.add_argument("--from-log", nargs="?", const=EXCEL_LOG_FILE, metavar="LOG_FILE",
+                        help="Read the Excel log and all its shards instead (default: EXCEL_LOG_FILE)")
+    parser.add_argument("--out", default=REPORT_FILE)
+    args = parser.parse_args(argv)
+
+    material_categories = CATALOG.get().material_categories
+    if args.from_log:
+        files = shard_files(args.from_log)
+        if not files:
+            parser.error(f"'{args.from_log}' was not found")
+        table = load_from_excel(files, material_categories)
+    else:
+        table = load_from_journal(args.journal, material_categories)
+    write_report(table, args.out)
+    print(f"Wrote a report of {len(table)} transaction(s) to '{args.out}'.")
+
+if __name__ == "__main__":
+    main()
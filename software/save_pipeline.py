@@ -0,0 +1,189 @@
+import queue
+import threading
+import time
+from metrics import METRICS
+
+# --- Save Status ---
+STATUS_PENDING = "pending"
+STATUS_SAVED = "saved"
+STATUS_FAILED = "failed"
+STATUS_RETRYING = "retrying"    # Log file could not be written; retry scheduled
+STATUS_FLUSHED = "flushed"      # Log file written after an earlier failure
+
+# --- Background Writer ---
+
+class SaveWorker(threading.Thread):
+    """
+    Writes transactions off the Tk thread. Transactions are fed through a
+    queue, stored in the journal and applied to the Excel log. The queue
+    itself is unbounded so flush, rebuild and stop requests never block the
+    caller; at most `max_queue` transactions may wait.
+    Progress is reported through `on_status(ticket, status, message)`,
+    called from this thread; GUI callers should forward it with after().
+
+    Journal writes are retried up to `max_retries` times. If the log file
+    cannot be written (e.g. it is open in Excel), the changes stay pending
+    (also in the writer's queue file) and the flush is retried every
+    `retry_delay` seconds. Pending changes left by an earlier run are
+    replayed when the thread starts.
+    """
+    def __init__(self, journal, log_writer, on_status, max_queue=100, retry_delay=5.0, max_retries=5):
+        super().__init__(daemon=True)
+        self.journal = journal
+        self.log_writer = log_writer
+        self.on_status = on_status
+        self.retry_delay = retry_delay
+        self.max_retries = max_retries
+
+        self.max_queue = max_queue
+        self.queue = queue.Queue()
+        self.ticket_lock = threading.Lock()
+        self.next_ticket = 1
+        self.saves_waiting = 0      # Transactions queued and not yet taken by the worker
+        self.retry_at = 0.0
+        self.flush_failing = False
+
+    def submit(self, entry_data):
+        """
+        Queues a transaction and returns its ticket number.
+        Raises queue.Full if the writer is too far behind.
+        """
+        with self.ticket_lock:
+            # Checked and reserved together, so concurrent producers (the API) cannot overfill it
+            if self.saves_waiting >= self.max_queue:
+                raise queue.Full
+            self.saves_waiting += 1
+            ticket = self.next_ticket
+            self.next_ticket += 1
+        # Reported before queuing so "pending" always arrives before "saved"
+        self._notify(ticket, STATUS_PENDING, "Waiting to be written.")
+        self.queue.put(("save", ticket, entry_data))
+        return ticket
+
+    def request_flush(self, callback=None):
+        """
+        Writes the log file as soon as the queued transactions are done, then
+        calls `callback(ok, message)` from this thread.
+        """
+        self.queue.put(("flush", None, callback))
+
+    def request_rebuild(self, rebuild, callback=None):
+        """
+        Runs `rebuild()` (e.g. regenerating the log from the journal) on this
+        thread once the queued transactions are done, so no transaction is
+        both in the journal export and applied afterwards. Then calls
+        `callback(ok, message)` from this thread.
+        """
+        self.queue.put(("rebuild", None, (rebuild, callback)))
+
+    def pending_count(self):
+        return self.saves_waiting
+
+    def stop(self, timeout=None):
+        """
+        Drains the queue, writes the log file and stops the thread.
+        """
+        self.queue.put(None)
+        self.join(timeout)
+
+    def _notify(self, ticket, status, message=""):
+        try:
+            self.on_status(ticket, status, message)
+        except Exception as e:
+            print(f"Save status callback error: {e}")
+
+    def run(self):
+        self._recover()
+        while True:
+            try:
+                item = self.queue.get(timeout=1.0)
+            except queue.Empty:
+                self._flush()
+                continue
+
+            if item is None:
+                self._close()
+                return
+
+            kind, ticket, payload = item
+            if kind == "save":
+                with self.ticket_lock:
+                    self.saves_waiting -= 1
+                self._save(ticket, payload)
+                self._flush()
+            elif kind == "flush":
+                ok, message = self._flush(force=True)
+                if payload: payload(ok, message)
+            elif kind == "rebuild":
+                rebuild, callback = payload
+                ok, message = self._rebuild(rebuild)
+                if callback: callback(ok, message)
+
+    def _save(self, ticket, entry_data):
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                t0 = METRICS.start()
+                self.journal.append(entry_data)
+                METRICS.stop("journal_write", t0)
+                break
+            except Exception as e:
+                print(f"Journal Write Error (attempt {attempt}): {e}")
+                if attempt == self.max_retries:
+                    self._notify(ticket, STATUS_FAILED, f"Could not save the transaction.\nError: {e}")
+                    return
+                time.sleep(self.retry_delay)
+
+        try:
+            self.log_writer.append(entry_data)
+        except Exception as e:
+            # Recorded in the journal; the log file can be rebuilt from it
+            print(f"Excel Write Error: {e}")
+            self._notify(ticket, STATUS_SAVED, f"Saved, but the log file was not updated: {e}")
+            return
+        self._notify(ticket, STATUS_SAVED, "Transaction saved.")
+
+    def _flush(self, force=False):
+        if not force and time.monotonic() < self.retry_at:
+            return False, "Retry scheduled."
+        try:
+            written = self.log_writer.flush() if force else self.log_writer.flush_if_due()
+        except Exception as e:
+            print(f"Excel Write Error: {e}")
+            self.retry_at = time.monotonic() + self.retry_delay
+            self.flush_failing = True
+            message = f"'{self.log_writer.file_name}' could not be written; retrying in {self.retry_delay:.0f} s.\nError: {e}\nEnsure file is closed."
+            self._notify(None, STATUS_RETRYING, message)
+            return False, message
+
+        if written and self.flush_failing:
+            self.flush_failing = False
+            self._notify(None, STATUS_FLUSHED, f"'{self.log_writer.file_name}' updated.")
+        return True, ""
+
+    def _rebuild(self, rebuild):
+        try:
+            rebuild()
+        except Exception as e:
+            print(f"Excel Export Error: {e}")
+            return False, str(e)
+        return True, ""
+
+    def _recover(self):
+        # Transactions left in the log's pending queue by a crash or a failed save
+        try:
+            replayed = self.log_writer.recover()
+        except Exception as e:
+            print(f"Excel Recovery Error: {e}")
+            return
+        if not replayed: return
+        print(f"Replaying {replayed} pending transaction(s) into '{self.log_writer.file_name}'.")
+        ok, _ = self._flush(force=True)
+        if ok:
+            self._notify(None, STATUS_FLUSHED, f"Recovered {replayed} pending transaction(s) into '{self.log_writer.file_name}'.")
+
+    def _close(self):
+        try:
+            self.log_writer.close()
+        except Exception as e:
+            print(f"Excel Write Error: {e}")
+            self._notify(None, STATUS_FAILED, f"'{self.log_writer.file_name}' could not be written on exit.\nError: {e}")
@@ -0,0 +1,222 @@
+import argparse
+import os
+import random
+import socket
+import time
+from datetime import datetime
+import serial
+from serial_protocol import build_frame
+
+# --- Simulated Scale ---
+# Sends what the scale controller sends: streamed readings while a load
+# settles and a "Date: dd/mm/yyyy, Weight: x.xx" line (or compact frames)
+# when a weighing is logged. The application connects to it through a
+# pseudo-terminal (Linux/macOS) or TCP ("socket://127.0.0.1:<port>").
+# Prefer the pseudo-terminal for timing work: over TCP, pyserial reports at
+# most one waiting byte, so the reader takes one byte per read and bursts
+# never reach the coalescing path the way they do on a real port.
+#
+#   python scale_simulator.py serve --tcp 7777 --rate 20 --noise 0.02
+#   python scale_simulator.py record --port COM3 --out capture.txt
+#   python scale_simulator.py serve --pty --replay capture.txt
+
+class ScaleSimulator:
+    """
+    Generates weighing cycles: the load settles on a target weight with
+    Gaussian `noise` (kg), the weighing is logged after `settle_s` seconds
+    and the load is removed. `lines()` yields (delay_s, data) pairs; each
+    `data` holds `burst` lines, so several lines arrive together.
+    """
+    def __init__(self, rate=10.0, noise=0.01, burst=1, frames=False, weights=None, settle_s=2.0, seed=None):
+        self.rate = float(rate)
+        self.noise = float(noise)
+        self.burst = max(1, int(burst))
+        self.frames = frames
+        self.weights = list(weights) if weights else None
+        self.settle_s = float(settle_s)
+        self.random = random.Random(seed)
+        self.sequence = 0
+
+    def reading_line(self, weight):
+        if self.frames:
+            return build_frame(b"S,%.2f" % weight)
+        return b"%.2f" % weight
+
+    def weighing_line(self, weight, now=None):
+        now = now or datetime.now()
+        date_str = now.strftime("%d/%m/%Y")
+        self.sequence += 1
+        if self.frames:
+            return build_frame(b"W,%d,%s,%s,%.2f" % (self.sequence, date_str.encode(), now.strftime("%H:%M:%S").encode(), weight))
+        return b"Date: %s, Weight: %.2f, Seq: %d" % (date_str.encode(), weight, self.sequence)
+
+    def cycle(self):
+        """
+        Lines of one weighing cycle, without timing.
+        """
+        target = self.random.choice(self.weights) if self.weights else round(self.random.uniform(0.5, 60.0), 2)
+        settle = max(1, int(self.settle_s * self.rate))
+        for step in (0.3, 0.7, 0.95):
+            yield self.reading_line(target * step + self.random.gauss(0, self.noise * 5))
+        for _ in range(settle):
+            yield self.reading_line(target + self.random.gauss(0, self.noise))
+        yield self.weighing_line(target)
+        for _ in range(max(1, int(self.rate))):
+            yield self.reading_line(abs(self.random.gauss(0, self.noise)))
+
+    def lines(self, cycles=None):
+        count = 0
+        pending = []
+        while cycles is None or count < cycles:
+            for line in self.cycle():
+                pending.append(line + b"\r\n")
+                if len(pending) >= self.burst:
+                    yield len(pending) / self.rate, b"".join(pending)
+                    pending = []
+            count += 1
+        if pending:
+            yield len(pending) / self.rate, b"".join(pending)
+
+# --- Captures ---
+# A capture has one received line per row: "<seconds since start>\t<line>".
+# Plain text files (one line per row, no timestamps) replay at a fixed rate.
+
+def replay_lines(file_name, rate=10.0, speed=1.0, loop=False):
+    """
+    Yields (delay_s, data) for the lines of a capture file.
+    """
+    while True:
+        previous = None
+        with open(file_name, "rb") as f:
+            for row in f:
+                row = row.rstrip(b"\r\n")
+                stamp, tab, line = row.partition(b"\t")
+                if tab:
+                    try:
+                        t = float(stamp)
+                    except ValueError:
+                        t, line = None, row
+                else:
+                    t, line = None, row
+                if t is None:
+                    delay = 1.0 / rate
+                else:
+                    delay = 0.0 if previous is None else max(0.0, t - previous) / speed
+                    previous = t
+                yield delay, line + b"\r\n"
+        if not loop:
+            return
+
+def record(port, out_file, baud_rate=115200, duration=None):
+    """
+    Saves the lines received from `port` as a capture file.
+    """
+    ser = serial.serial_for_url(port, baud_rate, timeout=1)
+    start = time.monotonic()
+    count = 0
+    try:
+        with open(out_file, "w", encoding="utf-8") as f:
+            while duration is None or time.monotonic() - start < duration:
+                raw = ser.readline()
+                if not raw: continue
+                line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+                f.write(f"{time.monotonic() - start:.3f}\t{line}\n")
+                count += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ser.close()
+    print(f"Recorded {count} lines to '{out_file}'.")
+
+# --- Transports ---
+
+def send_lines(source, write, on_sent=None):
+    """
+    Writes each (delay, data) of `source` after its delay. Delays are kept
+    on an absolute schedule, so slow writes do not lower the rate.
+    """
+    next_at = time.monotonic()
+    for delay, data in source:
+        next_at += delay
+        wait = next_at - time.monotonic()
+        if wait > 0: time.sleep(wait)
+        write(data)
+        if on_sent: on_sent(data)
+
+def serve_pty(source, on_ready=None, on_sent=None):
+    """
+    Sends `source` through a pseudo-terminal (not available on Windows).
+    """
+    import tty
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    name = os.ttyname(slave)
+    print(f"Simulated scale on {name}")
+    if on_ready: on_ready(name)
+    try:
+        send_lines(source, lambda data: os.write(master, data), on_sent)
+    finally:
+        os.close(master)
+        os.close(slave)
+
+def serve_tcp(source, port, host="127.0.0.1", on_ready=None, on_sent=None):
+    """
+    Waits for one client on host:port and sends `source` to it.
+    """
+    with socket.create_server((host, port)) as server:
+        url = f"socket://{host}:{server.getsockname()[1]}"
+        print(f"Simulated scale on {url}")
+        if on_ready: on_ready(url)
+        conn, _ = server.accept()
+        with conn:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                send_lines(source, conn.sendall, on_sent)
+            except (BrokenPipeError, ConnectionResetError):
+                print("Client disconnected.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulated scale controller for testing without hardware.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Send simulated or recorded lines")
+    transport = serve.add_mutually_exclusive_group(required=True)
+    transport.add_argument("--pty", action="store_true", help="Use a pseudo-terminal (Linux/macOS)")
+    transport.add_argument("--tcp", type=int, metavar="PORT", help="Listen on 127.0.0.1:PORT (0 picks a free port)")
+    serve.add_argument("--rate", type=float, default=10.0, help="Lines per second")
+    serve.add_argument("--noise", type=float, default=0.01, help="Standard deviation of the readings (kg)")
+    serve.add_argument("--burst", type=int, default=1, help="Lines sent together")
+    serve.add_argument("--settle", type=float, default=2.0, help="Seconds the load settles before it is logged")
+    serve.add_argument("--weights", type=float, nargs="*", help="Target weights (kg); random if omitted")
+    serve.add_argument("--frames", action="store_true", help="Send compact frames instead of text lines")
+    serve.add_argument("--cycles", type=int, help="Stop after this many weighings")
+    serve.add_argument("--seed", type=int)
+    serve.add_argument("--replay", metavar="FILE", help="Replay a capture instead of simulating")
+    serve.add_argument("--speed", type=float, default=1.0, help="Replay speed factor for timed captures")
+    serve.add_argument("--loop", action="store_true", help="Repeat the capture")
+
+    rec = commands.add_parser("record", help="Record the lines of a real scale")
+    rec.add_argument("--port", required=True)
+    rec.add_argument("--out", required=True)
+    rec.add_argument("--baud", type=int, default=115200)
+    rec.add_argument("--duration", type=float, help="Seconds to record (until Ctrl+C if omitted)")
+
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        record(args.port, args.out, args.baud, args.duration)
+        return
+
+    if args.replay:
+        source = replay_lines(args.replay, args.rate, args.speed, args.loop)
+    else:
+        source = ScaleSimulator(args.rate, args.noise, args.burst, args.frames, args.weights, args.settle, args.seed).lines(args.cycles)
+    try:
+        if args.pty:
+            serve_pty(source)
+        else:
+            serve_tcp(source, args.tcp)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
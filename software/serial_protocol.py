@@ -0,0 +1,130 @@
+import re
+from collections import namedtuple
+from functools import reduce
+from operator import xor
+
+# --- Line Formats ---
+# Text (default firmware output):  "Date: 12/12/2025, Weight: 10.50, Seq: 42" (older firmware
+# omits Seq) or a bare weight "10.50"
+# Compact frame (USE_COMPACT_FRAMES): "$W,<seq>,<dd/mm/yyyy>,<hh:mm:ss>,<kg>*<checksum>" for a
+# logged weighing and "$S,<kg>*<checksum>" for a streamed reading. The checksum is the XOR of
+# the bytes between '$' and '*', as two hex digits (same scheme as NMEA).
+# A record buffer dump (DUMP command, see bulk_ingest.py) sends "$R" frames with the
+# fields of "$W", between "$D,BEGIN,<count>" and "$D,END,<count>" frames.
+# The Weight field is captured up to the next comma, so a malformed value is
+# counted as a parse failure instead of reading as a date-only line
+TEXT_LINE_RE = re.compile(rb'Date: ([\d/]+)(?:, Weight:\s*([^,]*))?(?:, Seq: (\d+))?')
+WEIGHT_ONLY_RE = re.compile(rb'-?[\d.]+')  # Negative after tare drift, e.g. "-0.03"
+FRAME_RE = re.compile(rb'\$([^*]+)\*([0-9A-Fa-f]{2})')
+FRAME_DATE_RE = re.compile(rb'\d{2}/\d{2}/\d{4}')
+
+Reading = namedtuple("Reading", ["date", "weight", "time", "seq"])
+
+def frame_checksum(payload):
+    """
+    XOR of the payload bytes (between '$' and '*').
+    """
+    return reduce(xor, payload, 0)
+
+def build_frame(payload):
+    """
+    Wraps a payload (bytes) in a compact frame; used by tools and tests.
+    """
+    return b"$" + payload + b"*%02X" % frame_checksum(payload)
+
+class SerialStats:
+    """
+    Counters for one serial reader. Updated only by the reader thread.
+    """
+    def __init__(self):
+        self.lines_received = 0
+        self.lines_superseded = 0   # Valid readings replaced by a newer one in the same burst
+        self.readings_streamed = 0  # Weight-only readings (the firmware's live stream)
+        self.parse_failures = 0
+        self.checksum_failures = 0  # Compact frames rejected by the checksum
+
+    def summary(self):
+        return f"Lines: {self.lines_received}   Superseded: {self.lines_superseded}   Errors: {self.parse_failures}   Bad checksum: {self.checksum_failures}"
+
+# --- Parser ---
+
+class ProtocolParser:
+    """
+    Parses raw scale lines (bytes) with precompiled patterns. Only the date
+    field is decoded; weights are converted straight from bytes. Compact
+    frames failing the checksum are counted and rejected.
+    """
+    def __init__(self, stats=None):
+        self.stats = stats if stats is not None else SerialStats()
+
+    def parse(self, raw, weighing_types=(b"W",)):
+        """
+        Returns a Reading (fields not present in the line are None), or None
+        for empty lines and firmware messages. `weighing_types` are the frame
+        types read as logged weighings; bulk_ingest adds b"R".
+        """
+        line = raw.strip()
+        if not line:
+            return None
+        try:
+            if line[:1] == b"$":
+                return self._parse_frame(line, weighing_types)
+
+            m = TEXT_LINE_RE.match(line)
+            if m:
+                date_b, weight_b, seq_b = m.groups()
+                return Reading(date_b.decode('ascii'), float(weight_b) if weight_b is not None else None, None, int(seq_b) if seq_b else None)
+            if WEIGHT_ONLY_RE.fullmatch(line): #if line has separate weight only
+                return Reading(None, float(line), None, None)
+        except ValueError:
+            # Malformed numbers such as "1.2.3"
+            self.stats.parse_failures += 1
+        return None
+
+    def _parse_frame(self, line, weighing_types):
+        m = FRAME_RE.fullmatch(line)
+        if not m:
+            self.stats.parse_failures += 1
+            return None
+        payload, checksum = m.groups()
+        if frame_checksum(payload) != int(checksum, 16):
+            self.stats.checksum_failures += 1
+            return None
+
+        fields = payload.split(b",")
+        if fields[0] in weighing_types and len(fields) == 5 and FRAME_DATE_RE.fullmatch(fields[2]):
+            return Reading(fields[2].decode('ascii'), float(fields[4]), fields[3].decode('ascii'), int(fields[1]))
+        if fields[0] == b"S" and len(fields) == 2:
+            return Reading(None, float(fields[1]), None, None)
+        if fields[0] in (b"R", b"D"):
+            return None  # Buffer dump requested by bulk_ingest.py
+        self.stats.parse_failures += 1
+        return None
+
+    def coalesce(self, lines):
+        """
+        Parses a burst of lines. Returns (date_str, weight, weighings), or
+        None if no line was a reading. date_str and weight are the newest
+        values for the display (None if the burst did not contain them);
+        `weighings` lists every logged weighing of the burst (readings with
+        both a date and a weight) in order, so none is lost to coalescing.
+        """
+        stats = self.stats
+        date_str, weight = None, None
+        weighings = []
+        readings = 0
+        for raw in lines:
+            stats.lines_received += 1
+            reading = self.parse(raw)
+            if reading is None: continue
+
+            readings += 1
+            if reading.date is not None: date_str = reading.date
+            if reading.weight is not None: weight = reading.weight
+            if reading.date is not None and reading.weight is not None: weighings.append(reading)
+            elif reading.weight is not None: stats.readings_streamed += 1
+
+        if readings == 0:
+            return None
+        stats.lines_superseded += readings - 1
+        return date_str, weight, weighings
@@ -0,0 +1,51 @@
+import time
+import serial
+from serial_protocol import ProtocolParser
+from metrics import METRICS
+
+# --- Reader Thread ---
+
+def read_serial_data(port, baud_rate, app, parser=None):
+    """
+    Reads the scale until `app.running` is False. The read blocks until
+    bytes arrive, so readings are delivered without polling delay. All
+    complete lines received together are coalesced by `parser` and passed
+    to `app.process_reading(date_str, weight, weighings)` once; `weighings`
+    holds every logged weighing of the burst.
+    On connection loss `app.report_serial_error(port)` is called.
+    """
+    parser = parser if parser is not None else ProtocolParser()
+    ser = None
+    try:
+        # Also accepts pyserial URLs, e.g. "socket://127.0.0.1:7777" for scale_simulator.py
+        ser = serial.serial_for_url(port, baud_rate, timeout=1)
+        print(f"Opening serial port {port} at {baud_rate} baud...")
+        if "://" not in port:
+            time.sleep(2)  # Opening the port resets the ESP32
+        buffer = b""
+        while app.running:
+            # Wakes as soon as a byte arrives (or after the timeout to check `running`)
+            chunk = ser.read(1)
+            if not chunk: continue
+            t0 = METRICS.start()
+            chunk += ser.read(ser.in_waiting)
+            METRICS.stop("serial_read", t0)
+
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            if not lines: continue
+
+            t0 = METRICS.start()
+            reading = parser.coalesce(lines)
+            METRICS.stop("serial_parse", t0)
+            if reading is not None:
+                app.process_reading(*reading)
+    except serial.SerialException:
+        print(f"Connection failed on {port}.")
+        if app.running:
+            app.report_serial_error(port)
+    except Exception as e:
+        print(f"Unexpected serial thread error: {e}")
+    finally:
+        if ser and ser.is_open: ser.close()
+        print("Serial port closed.")
@@ -0,0 +1,70 @@
+import math
+import time
+from collections import deque
+
+# --- Stability Detection ---
+
+class StabilityDetector:
+    """
+    Streaming stability check for scale readings. Keeps the samples of the
+    last `hold_time` seconds with running sums, so each update is O(1)
+    amortized. A reading is stable once every sample for `hold_time`
+    seconds has stayed within `tolerance` (kg) of the running mean and the
+    standard deviation is below `tolerance`.
+    """
+    def __init__(self, tolerance=0.05, hold_time=1.5, min_samples=3):
+        self.tolerance = float(tolerance)
+        self.hold_time = float(hold_time)
+        self.min_samples = int(min_samples)
+        self.reset()
+
+    def reset(self):
+        self.samples = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.run_started = None
+        self.stable = False
+
+    def _push(self, t, weight):
+        self.samples.append((t, weight))
+        self.total += weight
+        self.total_sq += weight * weight
+
+    def _pop(self):
+        _, weight = self.samples.popleft()
+        self.total -= weight
+        self.total_sq -= weight * weight
+
+    @property
+    def mean(self):
+        return self.total / len(self.samples) if self.samples else 0.0
+
+    @property
+    def stddev(self):
+        n = len(self.samples)
+        if n < 2: return 0.0
+        mean = self.total / n
+        return math.sqrt(max(0.0, self.total_sq / n - mean * mean))
+
+    def update(self, weight, t=None):
+        """
+        Adds a reading and returns True while the weight is stable.
+        """
+        t = time.monotonic() if t is None else t
+
+        # A reading outside the band starts a new run
+        if self.samples and abs(weight - self.mean) > self.tolerance:
+            self.reset()
+        if self.run_started is None:
+            self.run_started = t
+
+        self._push(t, weight)
+        while self.samples and t - self.samples[0][0] > self.hold_time:
+            self._pop()
+
+        self.stable = (
+            t - self.run_started >= self.hold_time and
+            len(self.samples) >= self.min_samples and
+            self.stddev <= self.tolerance
+        )
+        return self.stable
@@ -0,0 +1,533 @@
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+from config import (JOURNAL_FILE, STATION_ID, SYNC_DIR, SYNC_URL, SYNC_TOKEN, SYNC_INTERVAL_S,
+    CONSOLIDATED_DB_FILE)
+from catalog import CATALOG
+from journal import TRANSACTION_FIELDS, TransactionJournal, export_to_excel
+
+# --- Multi-Station Sync ---
+# Every station (yard PC) sends the journal transactions added since its
+# last sync as a delta file. A consolidated SQLite store, keyed by
+# (station, seq), merges them:
+#
+#   python station_sync.py push --dir //server/recycling      (each station; or set SYNC_DIR)
+#   python station_sync.py merge --dir //server/recycling     (consolidation PC)
+#   python station_sync.py serve --port 8780 --token <secret> (stand-in server instead of a folder)
+#   python station_sync.py status
+#   python station_sync.py export --out Consolidated_Logs.xlsx
+#
+# A delta file is gzip-compressed JSON lines: a header
+#   {"format": 1, "station": "YARD-1", "since_seq": 120, "last_seq": 180, "count": 60, "fields": [...]}
+# then one array per transaction: seq followed by the values of "fields".
+# The store keeps the last merged seq of each station (its watermark). A
+# delta is merged if it continues the watermark (since_seq <= watermark),
+# otherwise it waits for the earlier ones. Merging a delta twice adds
+# nothing, and merging only reads the delta, never the history.
+#
+# A folder has no reply to tell a station about a lost delta, so each merge
+# writes <sync_dir>/acks/<station>.ack:
+#   {"station": "YARD-1", "merged_seq": 120, "gap": true, "ack_id": 1791234567890}
+# With "gap" set, the station's next push resends from merged_seq (once per ack).
+
+DELTA_FORMAT = 1
+DELTA_SUFFIX = ".delta.gz"
+DELTA_FIELDS = ["recorded_at"] + TRANSACTION_FIELDS
+DELTA_MAX_ROWS = 50000          # Larger exports are split into several deltas
+DELTA_NAME_RE = re.compile(r"^(.+)-(\d{10})-(\d{10})" + re.escape(DELTA_SUFFIX) + "$")
+INBOX_DIR = "inbox"
+MERGED_DIR = "merged"
+ACKS_DIR = "acks"
+ACK_SUFFIX = ".ack"
+
+MERGE_ADDED = "merged"
+MERGE_DUPLICATE = "duplicate"   # Already merged
+MERGE_GAP = "gap"               # An earlier delta of the station is missing
+
+def station_name(configured=STATION_ID):
+    """
+    STATION_ID, or the host name, made safe for file names.
+    """
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", configured or socket.gethostname()) or "STATION"
+
+# --- Delta Files ---
+
+def encode_delta(station, since_seq, last_seq, rows):
+    """
+    Compressed delta for `rows` ([seq, *DELTA_FIELDS] lists).
+    """
+    header = {
+        "format": DELTA_FORMAT, "station": station, "since_seq": since_seq,
+        "last_seq": last_seq, "count": len(rows), "fields": DELTA_FIELDS,
+    }
+    lines = [json.dumps(header, separators=(",", ":"))]
+    lines += [json.dumps(row, separators=(",", ":")) for row in rows]
+    return gzip.compress(("\n".join(lines) + "\n").encode("utf-8"), compresslevel=6)
+
+def decode_delta(data):
+    """
+    Returns (header, rows). Raises ValueError for damaged or foreign data.
+    """
+    try:
+        lines = gzip.decompress(data).decode("utf-8").splitlines()
+        header = json.loads(lines[0])
+        rows = [json.loads(line) for line in lines[1:] if line]
+    except (OSError, EOFError, UnicodeDecodeError, IndexError) as e:
+        raise ValueError(f"Not a delta file: {e}")
+    if not isinstance(header, dict) or header.get("format") != DELTA_FORMAT:
+        raise ValueError("Unknown delta format.")
+    if header.get("fields") != DELTA_FIELDS:
+        raise ValueError("The delta was written with different transaction fields.")
+    if not isinstance(header.get("station"), str) or not isinstance(header.get("since_seq"), int) or \
+       not isinstance(header.get("last_seq"), int):
+        raise ValueError("Incomplete delta header.")
+    if len(rows) != header.get("count") or any(not isinstance(r, list) or len(r) != len(DELTA_FIELDS) + 1 for r in rows):
+        raise ValueError("Truncated or damaged delta.")
+    return header, rows
+
+def delta_file_name(station, since_seq, last_seq):
+    return f"{station}-{since_seq:010d}-{last_seq:010d}{DELTA_SUFFIX}"
+
+def iter_deltas(journal, since_seq, max_rows=DELTA_MAX_ROWS):
+    """
+    Yields (since_seq, last_seq, rows) for the journal transactions after
+    `since_seq`, at most `max_rows` per delta.
+    """
+    rows = []
+    for tx in journal.iter_transactions(since_seq):
+        rows.append([tx["seq"]] + [tx[field] for field in DELTA_FIELDS])
+        if len(rows) >= max_rows:
+            yield since_seq, rows[-1][0], rows
+            since_seq, rows = rows[-1][0], []
+    if rows:
+        yield since_seq, rows[-1][0], rows
+
+# --- Station Side ---
+
+class FolderTarget:
+    """
+    Writes deltas to <sync_dir>/inbox (e.g. a network share). Files are
+    written under a temporary name and renamed, so a merge never sees half
+    a file.
+    """
+    def __init__(self, sync_dir):
+        self.sync_dir = sync_dir
+        self.inbox = os.path.join(sync_dir, INBOX_DIR)
+        self.key = f"dir:{os.path.abspath(sync_dir)}"
+
+    def missing_from(self, station):
+        """
+        (ack_id, merged_seq) when the last merge found a gap in this
+        station's deltas, None otherwise.
+        """
+        ack = read_ack(self.sync_dir, station)
+        if not ack or not ack.get("gap"): return None
+        return ack["ack_id"], ack["merged_seq"]
+
+    def send(self, station, since_seq, last_seq, data):
+        os.makedirs(self.inbox, exist_ok=True)
+        path = os.path.join(self.inbox, delta_file_name(station, since_seq, last_seq))
+        tmp_name = path + ".tmp"
+        with open(tmp_name, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+        return last_seq
+
+class ServerTarget:
+    """
+    Posts deltas to a sync server (`station_sync.py serve`). The server
+    merges them at once and answers with the station's watermark.
+    """
+    def __init__(self, url, token="", timeout=30.0):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.key = f"url:{self.url}"
+
+    def missing_from(self, station):
+        # The server answers a gap with 409 and its watermark (see send)
+        return None
+
+    def send(self, station, since_seq, last_seq, data):
+        request = urllib.request.Request(self.url + "/sync/deltas", data=data, method="POST")
+        request.add_header("Content-Type", "application/octet-stream")
+        if self.token: request.add_header("Authorization", f"Bearer {self.token}")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.load(response)["merged_seq"]
+        except urllib.error.HTTPError as e:
+            if e.code == 409:
+                # The server lost or never got earlier deltas: resend from its watermark
+                return json.load(e)["merged_seq"]
+            raise
+
+def make_target(sync_dir=SYNC_DIR, sync_url=SYNC_URL, token=SYNC_TOKEN):
+    if sync_url: return ServerTarget(sync_url, token)
+    if sync_dir: return FolderTarget(sync_dir)
+    return None
+
+def push(journal, station, target, max_rows=DELTA_MAX_ROWS):
+    """
+    Sends the transactions added since the last push to `target`. Returns
+    the number of transactions sent. The journal remembers what each target
+    acknowledged; a crash before that only causes a resend, which the
+    store ignores.
+    """
+    mark = journal.sync_mark(target.key)
+    gap = target.missing_from(station)
+    if gap is not None and journal.sync_mark(target.key + ":ack") != gap[0]:
+        # A delta was lost from the folder: send everything after the store's watermark again
+        journal.set_sync_mark(target.key + ":ack", gap[0])
+        if gap[1] < mark:
+            print(f"Sync: the store is missing deltas of {station} after #{gap[1]}; resending from there.")
+            mark = gap[1]
+            journal.set_sync_mark(target.key, mark)
+
+    sent = 0
+    for since_seq, last_seq, rows in iter_deltas(journal, mark, max_rows):
+        acked = target.send(station, since_seq, last_seq, encode_delta(station, since_seq, last_seq, rows))
+        journal.set_sync_mark(target.key, acked)
+        if acked < last_seq:
+            print(f"Sync: the server has {station} up to #{acked}; resending from there on the next push.")
+            break
+        if acked > last_seq:
+            # Already merged further, e.g. the sync marks were lost: skip ahead
+            if acked > journal.last_seq():
+                print(f"Sync Warning: the store has {station} up to #{acked}, beyond this journal. "
+                      f"If the journal was replaced, give this station a new STATION_ID.")
+            break
+        sent += len(rows)
+    return sent
+
+class SyncAgent:
+    """
+    Pushes new transactions every `interval` seconds from a daemon thread,
+    starting right away.
+    """
+    def __init__(self, journal, station, target, interval=300.0):
+        self.journal = journal
+        self.station = station
+        self.target = target
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        # Waits for a push in progress, which uses the journal
+        self.stop_event.set()
+        if self.thread.is_alive(): self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                sent = push(self.journal, self.station, self.target)
+                if sent: print(f"Sync: sent {sent} transaction(s) as {self.station}.")
+            except Exception as e:
+                print(f"Sync Error: {e}")
+            if self.stop_event.wait(self.interval):
+                return
+
+def start_sync_agent(journal):
+    """
+    Starts a SyncAgent if SYNC_DIR or SYNC_URL is configured; returns it or None.
+    """
+    target = make_target()
+    if target is None: return None
+    agent = SyncAgent(journal, station_name(), target, SYNC_INTERVAL_S)
+    agent.start()
+    return agent
+
+# --- Consolidated Store ---
+
+CREATE_STORE_SQL = [
+    f"""
+    CREATE TABLE IF NOT EXISTS transactions (
+        station TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        {', '.join(f'{field} {"REAL" if field.endswith("weight") or field == "tare" else "TEXT"}' for field in DELTA_FIELDS)},
+        PRIMARY KEY (station, seq)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stations (
+        station TEXT PRIMARY KEY,
+        merged_seq INTEGER NOT NULL,
+        merged_at TEXT,
+        transactions INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+]
+
+class ConsolidatedStore:
+    """
+    Transactions of every station in one SQLite file, with the watermark of
+    each station. The "transactions" table has the journal's columns (plus
+    station), so reports.load_from_journal() reads it as well.
+    """
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(file_name, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        for sql in CREATE_STORE_SQL:
+            self.conn.execute(sql)
+        self.insert_sql = (
+            f"INSERT OR IGNORE INTO transactions (station, seq, {', '.join(DELTA_FIELDS)}) "
+            f"VALUES ({', '.join('?' * (len(DELTA_FIELDS) + 2))})"
+        )
+
+    def merged_seq(self, station):
+        with self.lock:
+            row = self.conn.execute("SELECT merged_seq FROM stations WHERE station = ?", (station,)).fetchone()
+            return row[0] if row else 0
+
+    def merge(self, header, rows):
+        """
+        Applies one decoded delta in a single SQLite transaction. Returns
+        (status, added, merged_seq).
+        """
+        station, since_seq, last_seq = header["station"], header["since_seq"], header["last_seq"]
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT merged_seq FROM stations WHERE station = ?", (station,)).fetchone()
+                mark = row[0] if row else 0
+                if last_seq <= mark:
+                    result = (MERGE_DUPLICATE, 0, mark)
+                elif since_seq > mark:
+                    result = (MERGE_GAP, 0, mark)
+                else:
+                    cur = self.conn.executemany(self.insert_sql, ([station] + r for r in rows if r[0] > mark))
+                    added = max(cur.rowcount, 0)
+                    self.conn.execute(
+                        "INSERT INTO stations (station, merged_seq, merged_at, transactions) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(station) DO UPDATE SET merged_seq = excluded.merged_seq, "
+                        "merged_at = excluded.merged_at, transactions = transactions + excluded.transactions",
+                        (station, last_seq, datetime.now().isoformat(timespec="seconds"), added)
+                    )
+                    result = (MERGE_ADDED, added, last_seq)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def stations(self):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT station, merged_seq, merged_at, transactions FROM stations ORDER BY station"
+            ).fetchall()
+
+    def iter_transactions(self, batch_size=5000):
+        """
+        Yields transactions as dicts, like TransactionJournal, so
+        journal.export_to_excel() can write a consolidated log.
+        """
+        conn = sqlite3.connect(self.file_name)
+        conn.row_factory = sqlite3.Row
+        try:
+            cur = conn.execute("SELECT * FROM transactions ORDER BY station, seq")
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows: break
+                for row in rows:
+                    yield dict(row)
+        finally:
+            conn.close()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def ack_path(sync_dir, station):
+    return os.path.join(sync_dir, ACKS_DIR, station + ACK_SUFFIX)
+
+def read_ack(sync_dir, station):
+    try:
+        with open(ack_path(sync_dir, station), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_ack(sync_dir, station, merged_seq, gap):
+    path = ack_path(sync_dir, station)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_name = path + ".tmp"
+    with open(tmp_name, "w", encoding="utf-8") as f:
+        json.dump({"station": station, "merged_seq": merged_seq, "gap": gap, "ack_id": time.time_ns() // 10 ** 6}, f)
+    os.replace(tmp_name, path)
+
+def list_deltas(sync_dir):
+    """
+    (station, since_seq, file name) of the deltas in <sync_dir>/inbox.
+    """
+    try:
+        names = os.listdir(os.path.join(sync_dir, INBOX_DIR))
+    except FileNotFoundError:
+        return []
+    deltas = []
+    for name in names:
+        m = DELTA_NAME_RE.match(name)
+        if m: deltas.append((m.group(1), int(m.group(2)), name))
+    return sorted(deltas)
+
+def merge_folder(store, sync_dir):
+    """
+    Merges the deltas in <sync_dir>/inbox in order of station and seq.
+    Merged (and duplicate) files move to <sync_dir>/merged/<station>, so the
+    inbox only ever holds new deltas. Each station with deltas gets an ack
+    file with its watermark. Returns (files merged, transactions added,
+    files waiting).
+    """
+    inbox = os.path.join(sync_dir, INBOX_DIR)
+    deltas = list_deltas(sync_dir)
+    gaps = set()
+
+    merged = added = waiting = 0
+    for station, _, name in deltas:
+        path = os.path.join(inbox, name)
+        try:
+            with open(path, "rb") as f:
+                header, rows = decode_delta(f.read())
+            status, count, mark = store.merge(header, rows)
+        except (OSError, ValueError) as e:
+            print(f"Sync Error in '{name}': {e}")
+            waiting += 1
+            continue
+        if status == MERGE_GAP:
+            print(f"'{name}' waits for earlier deltas of {station} (merged up to #{mark}).")
+            gaps.add(station)
+            waiting += 1
+            continue
+        done_dir = os.path.join(sync_dir, MERGED_DIR, station)
+        os.makedirs(done_dir, exist_ok=True)
+        os.replace(path, os.path.join(done_dir, name))
+        merged += 1
+        added += count
+
+    for station in {station for station, _, _ in deltas}:
+        write_ack(sync_dir, station, store.merged_seq(station), station in gaps)
+    return merged, added, waiting
+
+# --- Stand-in Server ---
+
+def serve(store, host="0.0.0.0", port=8780, token=""):
+    """
+    Sync server for stations without a shared folder. Raises ValueError
+    without a token unless `host` is this PC only (see api_server):
+      POST /sync/deltas   body: a delta file; 200 when merged or already
+                          merged, 409 with the watermark when earlier deltas
+                          are missing
+      GET  /sync/stations watermark of every station
+    """
+    from aiohttp import web  # Only needed on the consolidation PC
+    from api_server import check_listen_address
+    check_listen_address(host, token)
+
+    @web.middleware
+    async def check_token(request, handler):
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            return web.json_response({"error": "Unauthorized"}, status=401)
+        return await handler(request)
+
+    async def post_delta(request):
+        try:
+            header, rows = decode_delta(await request.read())
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        status, added, mark = await asyncio.get_running_loop().run_in_executor(None, store.merge, header, rows)
+        print(f"{header['station']}: {status}, {added} new, merged up to #{mark}")
+        return web.json_response(
+            {"status": status, "added": added, "merged_seq": mark}, status=409 if status == MERGE_GAP else 200
+        )
+
+    async def get_stations(request):
+        return web.json_response([
+            {"station": s, "merged_seq": seq, "merged_at": at, "transactions": n} for s, seq, at, n in store.stations()
+        ])
+
+    app = web.Application(middlewares=[check_token], client_max_size=256 * 1024 ** 2)
+    app.add_routes([web.post("/sync/deltas", post_delta), web.get("/sync/stations", get_stations)])
+    web.run_app(app, host=host, port=port, print=lambda *_: print(f"Sync server listening on http://{host}:{port}"))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Send station transactions to, and merge them into, a consolidated store.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    push_cmd = commands.add_parser("push", help="Send this station's new transactions")
+    push_cmd.add_argument("--journal", default=JOURNAL_FILE)
+    push_cmd.add_argument("--station", default=STATION_ID, help="Station name (default: STATION_ID or the host name)")
+    push_cmd.add_argument("--dir", default=SYNC_DIR, help="Shared sync folder")
+    push_cmd.add_argument("--url", default=SYNC_URL, help="Sync server, e.g. http://10.0.0.5:8780")
+    push_cmd.add_argument("--token", default=SYNC_TOKEN)
+
+    for name, help_text in [("merge", "Merge the deltas of a shared folder"), ("serve", "Run the stand-in sync server"),
+                            ("status", "List the stations in the store"), ("export", "Write the store as an Excel log")]:
+        cmd = commands.add_parser(name, help=help_text)
+        cmd.add_argument("--store", default=CONSOLIDATED_DB_FILE)
+        if name == "merge": cmd.add_argument("--dir", default=SYNC_DIR, required=not SYNC_DIR)
+        if name == "status": cmd.add_argument("--dir", default=SYNC_DIR, help="Also list deltas waiting in this folder")
+        if name == "serve":
+            cmd.add_argument("--host", default="0.0.0.0")
+            cmd.add_argument("--port", type=int, default=8780)
+            cmd.add_argument("--token", default=SYNC_TOKEN)
+        if name == "export": cmd.add_argument("--out", default="Consolidated_Logs.xlsx")
+    args = parser.parse_args(argv)
+
+    if args.command == "push":
+        target = make_target(args.dir, args.url, args.token)
+        if target is None:
+            parser.error("give --dir or --url (or set SYNC_DIR / SYNC_URL in config.py)")
+        journal = TransactionJournal(args.journal)
+        try:
+            station = station_name(args.station)
+            print(f"Sent {push(journal, station, target)} transaction(s) as {station}.")
+        finally:
+            journal.close()
+        return
+
+    store = ConsolidatedStore(args.store)
+    try:
+        if args.command == "merge":
+            merged, added, waiting = merge_folder(store, args.dir)
+            print(f"Merged {merged} delta file(s), {added} new transaction(s); {waiting} waiting.")
+        elif args.command == "serve":
+            try:
+                serve(store, args.host, args.port, args.token)
+            except ValueError as e:
+                parser.error(str(e))
+        elif args.command == "status":
+            waiting = {}
+            for station, since_seq, _ in list_deltas(args.dir) if args.dir else []:
+                waiting.setdefault(station, []).append(since_seq)
+            for station, seq, merged_at, count in store.stations():
+                print(f"{station:<20} #{seq:<10} {count:>10} transaction(s)   last merge {merged_at}")
+                stuck = [since_seq for since_seq in waiting.pop(station, []) if since_seq > seq]
+                if stuck:
+                    print(f"{'':<20} gap: {len(stuck)} delta(s) wait for #{seq + 1}-#{min(stuck)}; the station resends them on its next push")
+            for station, stuck in sorted(waiting.items()):
+                print(f"{station:<20} never merged: {len(stuck)} delta(s) wait for #1-#{min(stuck)}")
+        elif args.command == "export":
+            sheets = export_to_excel(store, args.out, CATALOG.get().log_schedule)
+            print(f"Wrote {sheets} sheet(s) to '{args.out}'.")
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
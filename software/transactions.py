@@ -0,0 +1,47 @@
+from catalog import CATALOG
+
+# --- Transaction Entry ---
+# Shared by the weighing panel and the API server, so a transaction is
+# checked the same way wherever it is registered.
+
+PLACEHOLDER_DATES = ("Waiting...", "N/A", "Disconnected")
+
+def validate_transaction(date_str, packaging, category, material, collector, collectors):
+    """
+    Checks the fields of a new transaction. Returns (title, message) for the
+    first problem found, or None if the transaction can be registered.
+    Zero or negative weights are not rejected here; callers confirm them.
+    """
+    if date_str in (None, "") or date_str in PLACEHOLDER_DATES or \
+       any(not v or "Select" in v for v in [category, material, collector]):
+        return ("Incomplete Data", "Please fill all fields and wait for scale data.")
+
+    catalog = CATALOG.get()
+    if packaging not in catalog.tares:
+        return ("Invalid Data", f"Unknown packaging '{packaging}'.")
+
+    if (category, material) not in catalog.logged_names:
+        return ("Invalid Data", f"'{material}' is not a material of '{category}'.")
+
+    if collector not in collectors:
+        return ("Unknown Collector", f"'{collector}' is not in the collector list. Pick a name from the dropdown.")
+    return None
+
+def build_transaction(date_str, gross_weight, packaging, category, material, collector, collectors, scale):
+    """
+    Returns the entry dict stored in the journal and the Excel log.
+    """
+    catalog = CATALOG.get()
+    tare = catalog.tares.get(packaging, 0.0)
+    return {
+        "date": date_str,
+        "gross_weight": gross_weight,
+        "packaging": packaging,
+        "tare": tare,
+        "net_weight": round(gross_weight - tare, 2),
+        "category": category,
+        "material": catalog.logged_names.get((category, material)) or material.upper(),
+        "collector": collector.upper(),
+        "collector_id": collectors.get(collector, "N/A"),
+        "scale": scale,
+    }
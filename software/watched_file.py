@@ -0,0 +1,50 @@
+import os
+import threading
+
+# --- Watched Files ---
+
+class WatchedFile:
+    """
+    Base for cached views of a file (collectors workbook, catalog). The file
+    is only read again when its modification time or size changes;
+    start_watching() checks this in a background thread and reports
+    changes through `on_change(self.get())`.
+    Subclasses implement get(), which returns the cached view, and
+    refresh(force=False), which reloads the file if it changed (or always
+    with force) and returns True after a reload.
+    """
+    watcher_name = "File"   # Used in watcher error messages
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.lock = threading.Lock()
+        self.signature = None
+        self.watch_stop = threading.Event()
+        self.watch_thread = None
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.file_name)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def start_watching(self, interval, on_change):
+        """
+        Checks the file every `interval` seconds and calls `on_change` from
+        the watcher thread after a reload.
+        """
+        def watch():
+            while not self.watch_stop.wait(interval):
+                try:
+                    if self.refresh():
+                        on_change(self.get())
+                except Exception as e:
+                    print(f"{self.watcher_name} watcher error: {e}")
+
+        self.watch_stop.clear()
+        self.watch_thread = threading.Thread(target=watch, daemon=True)
+        self.watch_thread.start()
+
+    def stop_watching(self):
+        self.watch_stop.set()